@@ -1,66 +1,133 @@
-import streamlit as st
-from transformers import pipeline
-import spacy
-import pytesseract
-from PIL import Image
-import pdfplumber
+import argparse
 import io
-import os
+import itertools
+import json
+import mimetypes
+import re
+import sys
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import clinical_rules as rules
+import document_extraction
+import note_qa
+from model_registry import registry
+from result_cache import ResultCache, content_hash
+
+# Heavy dependencies (transformers/torch, spaCy, Tesseract, PDF tooling) are
+# imported on first use, not here, so importing this module stays cheap for
+# every Streamlit worker and batch process. Use warmup() to preload them.
 
 # --- CONFIGURATION ---
-# Check if running on local Windows machine or Cloud Linux using os.name
-if os.name == 'nt':  # 'nt' is the internal code for Windows
-    # Update this path if your local Tesseract is installed elsewhere
-    pytesseract.pytesseract.tesseract_cmd = r'D:\DevData\Tessarat\tesseract.exe'
+# Tesseract lookup lives with the extraction code that uses it
+load_tesseract = document_extraction.load_tesseract
 
 # --- SELF-HEALING SPACY LOADER ---
-# This block forces the cloud to download the model if it's missing
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    print("Spacy model not found. Downloading now...")
-    from spacy.cli import download # type: ignore
-    download("en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
-
-# --- CACHED AI MODELS ---
-@st.cache_resource
-def load_summarizer():
+# Forces the cloud to download the model if it's missing
+def _build_spacy():
+    import spacy
+    try:
+        return spacy.load("en_core_web_sm")
+    except OSError:
+        print("Spacy model not found. Downloading now...")
+        from spacy.cli import download # type: ignore
+        download("en_core_web_sm")
+        return spacy.load("en_core_web_sm")
+
+# --- AI MODELS ---
+# Built on first use and held in the shared model registry, which accounts
+# for their memory and evicts the least recently used under its budget.
+def _build_summarizer():
+    from transformers import pipeline
     return pipeline("summarization", model="facebook/bart-large-cnn", device=-1)
 
-@st.cache_resource
-def load_ner():
+def _build_ner():
+    from transformers import pipeline
     return pipeline("token-classification", model="d4data/biomedical-ner-all", aggregation_strategy="simple", device=-1)
 
-@st.cache_resource
-def load_qa():
+def _build_qa():
+    from transformers import pipeline
     return pipeline("question-answering", model="deepset/roberta-base-squad2", device=-1)
 
+registry.register('spacy', _build_spacy)
+registry.register('summarizer', _build_summarizer)
+registry.register('ner', _build_ner)
+registry.register('qa', _build_qa)
+
+def load_spacy():
+    return registry.get('spacy')
+
+def load_summarizer():
+    return registry.get('summarizer')
+
+def load_ner():
+    return registry.get('ner')
+
+def load_qa():
+    return registry.get('qa')
+
+def _load_ocr():
+    import pdfplumber  # noqa: F401
+    from PIL import Image  # noqa: F401
+    return load_tesseract()
+
+def warmup(components=('ner', 'qa')):
+    """
+    Preload heavy components ahead of the first request instead of on it.
+    `components` may name any registered model (ner, qa, spacy, summarizer)
+    or 'ocr'. Returns the seconds each one took to load (near zero when it
+    was already loaded).
+    """
+    timings = {}
+    for name in components:
+        started = time.perf_counter()
+        if name == 'ocr':
+            _load_ocr()
+        elif name in registry.registered():
+            registry.get(name)
+        else:
+            raise ValueError(f"Unknown component '{name}'. Choose from: ocr, {', '.join(registry.registered())}")
+        timings[name] = round(time.perf_counter() - started, 3)
+    return timings
+
 # --- CORE FUNCTIONS ---
 def extract_text_from_file(uploaded_file):
-    file_type = uploaded_file.type
-    text = ""
+    """
+    Text of an uploaded image or PDF. PDF pages use their text layer when
+    present and are OCR'd in parallel otherwise (see document_extraction).
+    """
     try:
-        if "image" in file_type:
-            image = Image.open(uploaded_file)
-            text = pytesseract.image_to_string(image)
-        elif "pdf" in file_type:
-            with pdfplumber.open(uploaded_file) as pdf:
-                for page in pdf.pages:
-                    extracted = page.extract_text()
-                    if extracted:
-                        text += extracted + "\n"
-        return text
+        return extract_document(uploaded_file).get('text', '')
     except Exception as e:
         return f"Error reading file: {e}"
 
+def extract_document(uploaded_file, workers=None):
+    """Like extract_text_from_file, but also returns per-page methods and timings."""
+    return document_extraction.extract_document(uploaded_file, uploaded_file.type, workers=workers)
+
+def iter_extracted_pages(uploaded_file, workers=None, first_page=0):
+    """
+    Yield an upload's pages (PageResult: index, text, method, seconds) in
+    order as each one finishes, so the first pages can be shown and analyzed
+    while later ones are still in OCR. `first_page` resumes a partial run.
+    """
+    return document_extraction.iter_document_pages(uploaded_file, uploaded_file.type,
+                                                   workers=workers, first_page=first_page)
+
+def count_pages(uploaded_file):
+    return document_extraction.page_count(uploaded_file, uploaded_file.type)
+
+def pages_to_text(pages, file_type):
+    """Document text from the pages extracted so far."""
+    return document_extraction.document_text(pages, file_type)
+
 def summarize_medical_text(text):
     """
     Build a comprehensive, clean structured clinical summary from a patient medical record.
     Uses section-aware parsing and deduplication for accurate, non-repetitive output.
+    All patterns come pre-compiled from the clinical_rules registry.
     """
-    import re
-
     if len(text) < 50:
         return "Text is too short to summarize."
 
@@ -71,21 +138,7 @@ def summarize_medical_text(text):
     # STEP 1: SECTION SEGMENTATION
     # Split the document into named clinical sections
     # ─────────────────────────────────────────────────────────────
-    section_headers = {
-        'hpi':        r'history of present illness|hpi',
-        'pmh':        r'past medical history|past surgical|medical history|surgical\s*[-–]',
-        'fhx':        r'family history',
-        'social':     r'social history',
-        'ros':        r'review of systems',
-        'vitals':     r'vital signs',
-        'physical':   r'physical examination|general:',
-        'assessment': r'assessment|differential diagnosis|impression',
-        'plan':       r'^plan\s*:',
-        'allergies':  r'allerg',
-        'medications':r'medication',
-    }
-
-    sections = {k: [] for k in section_headers}
+    sections = {k: [] for k, _ in rules.SECTION_HEADERS}
     current_section = 'hpi'
 
     for line in lines:
@@ -93,8 +146,8 @@ def summarize_medical_text(text):
         if not line_strip:
             continue
         matched = False
-        for sec, pattern in section_headers.items():
-            if re.search(pattern, line_strip, re.IGNORECASE):
+        for sec, pattern in rules.SECTION_HEADERS:
+            if pattern.search(line_strip):
                 current_section = sec
                 matched = True
                 break
@@ -112,7 +165,7 @@ def summarize_medical_text(text):
     patient_sex  = None
 
     # Name from "Patient Name:" header line
-    name_hdr = re.search(r'patient\s*name\s*:\s*([A-Za-z,\s]+)', text, re.IGNORECASE)
+    name_hdr = rules.PATIENT_NAME.search(text)
     if name_hdr:
         raw = name_hdr.group(1).strip().split('\n')[0].strip(' ,')
         # Reformat "Last, First" → "First Last"
@@ -123,7 +176,7 @@ def summarize_medical_text(text):
             patient_name = raw
 
     # Age + gender from free text
-    age_m = re.search(r'(\d{1,3})\s*[-–]?\s*y(?:ear)?(?:s)?[\s/-]*o(?:ld)?\s+([A-Za-z]+)', text, re.IGNORECASE)
+    age_m = rules.AGE_SEX.search(text)
     if age_m:
         patient_age = age_m.group(1)
         gender_raw  = age_m.group(2).lower()
@@ -141,59 +194,32 @@ def summarize_medical_text(text):
 
     # Duration — pick the FIRST clear duration mentioned
     duration = None
-    for m in re.finditer(
-        r'(\d+)\s*[-–]?\s*(day|week|month|year|hour)s?',
-        hpi_body, re.IGNORECASE
-    ):
+    for m in rules.DURATION.finditer(hpi_body):
         val, unit = m.group(1), m.group(2).lower()
         duration = f"{val} {unit}{'s' if int(val) != 1 else ''}"
         break
 
     # Chief complaint — prefer "Chief Complaint" section line
     chief = None
-    cc_m = re.search(r'chief complaint\s*[&:]\s*(?:id\s*:)?\s*(.+)', text, re.IGNORECASE)
+    cc_m = rules.CHIEF_COMPLAINT.search(text)
     if cc_m:
         chief = cc_m.group(1).strip()[:120]
     if not chief:
         # Fallback: first mention of a symptom
-        sym_scan = re.search(
-            r'(chest pain|shortness of breath|dyspnea|abdominal pain|headache|'
-            r'fever|cough|nausea|vomiting|dizziness|palpitations)',
-            hpi_body, re.IGNORECASE
-        )
+        sym_scan = rules.CHIEF_SYMPTOM.search(hpi_body)
         chief = sym_scan.group(1) if sym_scan else "clinical evaluation"
 
     # Symptom details from HPI
     symptom_details = []
-    sym_map = [
-        (r'exertional|on exertion',                    'exertional'),
-        (r'radiates?(?:d)? to|radiation to',           'radiating'),
-        (r'shortness of breath|dyspnea',               'shortness of breath'),
-        (r'diaphor|sweating',                          'diaphoresis'),
-        (r'nausea',                                    'nausea'),
-        (r'vomiting',                                  'vomiting'),
-        (r'palpitations',                              'palpitations'),
-        (r'dizziness|dizzy',                           'dizziness'),
-        (r'syncope|faint',                             'syncope'),
-        (r'sob|shortness',                             'SOB'),
-        (r'orthopnea',                                 'orthopnea'),
-        (r'paroxysmal nocturnal',                      'PND'),
-    ]
-    seen_syms = set()
-    for pattern, label in sym_map:
-        if re.search(pattern, hpi_body, re.IGNORECASE) and label not in seen_syms:
-            symptom_details.append(label)
-            seen_syms.add(label)
+    for label in rules.SYMPTOM_MATCHER.labels(hpi_body):
+        symptom_details.append(label)
 
     # Radiation destination
-    rad_m = re.search(r'radiates?\s+(?:to|up to|down to|into)\s+(?:the\s+)?([a-z\s]+)', hpi_body, re.IGNORECASE)
+    rad_m = rules.RADIATION.search(hpi_body)
     radiation_str = f"radiating to {rad_m.group(1).strip()}" if rad_m else None
 
     # Pain character
-    char_m = re.search(
-        r'(dull|sharp|aching|burning|stabbing|pressure|squeezing|tightness|throbbing)',
-        hpi_body, re.IGNORECASE
-    )
+    char_m = rules.PAIN_CHARACTER.search(hpi_body)
     pain_char = char_m.group(1).lower() if char_m else None
 
     # ─────────────────────────────────────────────────────────────
@@ -201,48 +227,20 @@ def summarize_medical_text(text):
     # ─────────────────────────────────────────────────────────────
     pmh_body = sec_text('pmh')
 
-    condition_map = [
-        (r'\bhypertension\b|\bhtn\b',                          'Hypertension'),
-        (r'\bdiabetes\b|\bdm\s*(?:type\s*)?\d?\b|\bt2dm\b',   'Diabetes mellitus'),
-        (r'\basthma\b',                                        'Asthma'),
-        (r'\bcopd\b|chronic obstructive',                      'COPD'),
-        (r'\batrial fibrillation\b|\bafib\b|\baf\b',           'Atrial fibrillation'),
-        (r'\bcad\b|coronary artery disease',                   'Coronary artery disease (CAD)'),
-        (r'\bheart failure\b|\bchf\b',                         'Congestive heart failure'),
-        (r'\bstroke\b|\bcva\b',                                'Prior stroke/CVA'),
-        (r'\bhyperlipidemia\b|\bdyslipidemia\b|\bhigh cholesterol\b', 'Hyperlipidemia'),
-        (r'\bpeptic ulcer\b|\bpud\b',                          'Peptic ulcer disease'),
-        (r'\brenal\b.*\bfailure\b|\bckd\b',                   'Chronic kidney disease'),
-        (r'\bhypothyroidism\b|\bthyroid\b',                    'Thyroid disease'),
-        (r'\bosteoporosis\b',                                  'Osteoporosis'),
-        (r'\banemia\b',                                        'Anemia'),
-        (r'\bgerd\b|gastro.esophageal reflux',                 'GERD'),
-        (r'\bhysterectomy\b',                                  'Hysterectomy (surgical)'),
-        (r'\boophorectomy\b|\bbso\b',                          'Oophorectomy (surgical)'),
-        (r'\bappendectomy\b',                                   'Appendectomy (surgical)'),
-        (r'\bcholecystectomy\b',                               'Cholecystectomy (surgical)'),
-        (r'\bbunionectomy\b',                                  'Bunionectomy (surgical)'),
-        (r'\bmenopause\b|surgical menopause',                  'Surgical menopause'),
-        (r'\bpenicillin\b.*\ballerg|\ballerg.*\bpenicillin',   'Penicillin allergy'),
-    ]
-
     pmh_entries = {}   # label → year_str or None (ordered dict via insertion)
     search_scope = (pmh_body + ' ' + text_lower)  # search full text for conditions
 
-    for pattern, label in condition_map:
+    for label, m_start, m_end in rules.CONDITION_MATCHER.find(search_scope):
         # Only record each label ONCE (deduplication)
         if label in pmh_entries:
             continue
-        m = re.search(pattern, search_scope, re.IGNORECASE)
-        if not m:
-            continue
         # Find associated year — look in a window around the match
-        start = max(0, m.start() - 80)
-        end   = min(len(search_scope), m.end() + 80)
+        start = max(0, m_start - 80)
+        end   = min(len(search_scope), m_end + 80)
         context = search_scope[start:end]
 
-        year_ago = re.search(r'(\d{1,2})\s*(?:year|yr)s?\s*ago', context, re.IGNORECASE)
-        abs_year  = re.search(r'\b(19|20)\d{2}\b', context)
+        year_ago = rules.YEARS_AGO.search(context)
+        abs_year  = rules.ABSOLUTE_YEAR.search(context)
 
         if year_ago:
             pmh_entries[label] = f"{year_ago.group(1)} year{'s' if int(year_ago.group(1))>1 else ''} ago"
@@ -256,20 +254,8 @@ def summarize_medical_text(text):
     # ─────────────────────────────────────────────────────────────
     fhx_body = sec_text('fhx') + ' ' + text_lower
     fhx_items = []
-    fhx_map = [
-        (r'premature\s+cad|early\s+(?:ascvd|cad|heart)',     'premature CAD'),
-        (r'(?:father|mother|brother|sister|parent).*heart attack|mi', 'family MI'),
-        (r'family.*coronary|coronary.*family',                'coronary artery disease'),
-        (r'family.*diabetes',                                 'diabetes'),
-        (r'family.*hypertension',                             'hypertension'),
-        (r'family.*cancer',                                   'cancer'),
-        (r'family.*stroke',                                   'stroke'),
-    ]
-    seen_fhx = set()
-    for pattern, label in fhx_map:
-        if re.search(pattern, fhx_body, re.IGNORECASE) and label not in seen_fhx:
-            fhx_items.append(label)
-            seen_fhx.add(label)
+    for label in rules.FAMILY_HISTORY_MATCHER.labels(fhx_body):
+        fhx_items.append(label)
 
     # ─────────────────────────────────────────────────────────────
     # STEP 6: SOCIAL HISTORY
@@ -278,24 +264,24 @@ def summarize_medical_text(text):
     social_items = []
 
     smoking = None
-    if re.search(r'non[- ]?smok|no\s+tobacco|tobacco\s*use\s*:\s*none|does not smoke', soc_body, re.IGNORECASE):
+    if rules.NON_SMOKER.search(soc_body):
         smoking = 'Non-smoker'
-    elif re.search(r'smok|tobacco', soc_body, re.IGNORECASE):
-        pk_m = re.search(r'(\d+)\s*pack', soc_body, re.IGNORECASE)
+    elif rules.SMOKER.search(soc_body):
+        pk_m = rules.PACK_YEARS.search(soc_body)
         smoking = f"Smoker ({pk_m.group(1)}-pack history)" if pk_m else 'Smoker'
     if smoking:
         social_items.append(smoking)
 
     alcohol = None
-    if re.search(r'denies\s+alcohol|no\s+alcohol|alcohol.*none', soc_body, re.IGNORECASE):
+    if rules.NON_DRINKER.search(soc_body):
         alcohol = 'Non-drinker'
-    elif re.search(r'alcohol|beer|wine|drink', soc_body, re.IGNORECASE):
+    elif rules.DRINKER.search(soc_body):
         alcohol = 'Social drinker'
     if alcohol:
         social_items.append(alcohol)
 
     # Hormone/medication note
-    if re.search(r'not on hormone|no hormone replacement|no hrt', soc_body, re.IGNORECASE):
+    if rules.NO_HRT.search(soc_body):
         social_items.append('Not on HRT')
 
     # ─────────────────────────────────────────────────────────────
@@ -303,11 +289,11 @@ def summarize_medical_text(text):
     # ─────────────────────────────────────────────────────────────
     vitals_body = sec_text('vitals')
     vitals = {}
-    bp_m   = re.search(r'blood pressure\s*:?\s*(\d+/\d+)|bp\s*:?\s*(\d+/\d+)', vitals_body, re.IGNORECASE)
-    pr_m   = re.search(r'pulse\s*:?\s*(\d+)|heart rate\s*:?\s*(\d+)', vitals_body, re.IGNORECASE)
-    temp_m = re.search(r'temp(?:erature)?\s*:?\s*([\d.]+)', vitals_body, re.IGNORECASE)
-    rr_m   = re.search(r'respiration\s*:?\s*(\d+)|rr\s*:?\s*(\d+)', vitals_body, re.IGNORECASE)
-    spo2_m = re.search(r'spo2\s*:?\s*(\d+)%?|o2\s*sat\s*:?\s*(\d+)', vitals_body, re.IGNORECASE)
+    bp_m   = rules.BLOOD_PRESSURE.search(vitals_body)
+    pr_m   = rules.PULSE.search(vitals_body)
+    temp_m = rules.TEMPERATURE.search(vitals_body)
+    rr_m   = rules.RESPIRATION.search(vitals_body)
+    spo2_m = rules.SPO2.search(vitals_body)
 
     if bp_m:   vitals['BP']   = (bp_m.group(1) or bp_m.group(2))
     if pr_m:   vitals['HR']   = (pr_m.group(1) or pr_m.group(2))
@@ -320,20 +306,9 @@ def summarize_medical_text(text):
     # ─────────────────────────────────────────────────────────────
     phys_body = sec_text('physical')
     exam_findings = []
-    exam_map = [
-        (r'murmur',                              'Cardiac murmur noted'),
-        (r'third heart sound|s3\b',              'S3 heart sound present'),
-        (r'fourth heart sound|s4\b',             'S4 heart sound present'),
-        (r'crackle|rale',                        'Pulmonary crackles'),
-        (r'wheez',                               'Wheezing'),
-        (r'bruit',                               'Abdominal bruit'),
-        (r'edema',                               'Peripheral edema'),
-        (r'jugular venous|jvp|jvd',              'Elevated JVP'),
-        (r'hepatomegaly|liver.*enlarg',          'Hepatomegaly'),
-    ]
-    for pattern, label in exam_map:
-        if re.search(pattern, phys_body + ' ' + text_lower, re.IGNORECASE):
-            exam_findings.append(label)
+    exam_scope = phys_body + ' ' + text_lower
+    for label in rules.EXAM_MATCHER.labels(exam_scope):
+        exam_findings.append(label)
 
     # ─────────────────────────────────────────────────────────────
     # STEP 9: ASSESSMENT (working/likely diagnoses)
@@ -342,7 +317,7 @@ def summarize_medical_text(text):
     assessments = []
     if assess_body:
         # Extract numbered assessment items
-        for m in re.finditer(r'^\s*\d+\.\s+(.+)', assess_body, re.MULTILINE):
+        for m in rules.ASSESSMENT_ITEM.finditer(assess_body):
             item = m.group(1).strip()
             if len(item) > 5:
                 assessments.append(item[:120])
@@ -377,17 +352,17 @@ def summarize_medical_text(text):
         hpi_modifiers.append(rad_clean)
 
     aggravating = []
-    if re.search(r'exertional|on exertion|walking|working|physical activity', hpi_body, re.IGNORECASE):
+    if rules.AGGRAVATED_BY_EXERTION.search(hpi_body):
         aggravating.append("physical exertion")
-    if re.search(r'lying|recumbent|at rest during sleep|nocturnal', hpi_body, re.IGNORECASE):
+    if rules.AGGRAVATED_BY_REST.search(hpi_body):
         aggravating.append("rest")
     if aggravating:
         hpi_modifiers.append(f"aggravated by {' and '.join(aggravating)}")
 
     relieving = []
-    if re.search(r'relieved.*rest|resolved.*rest|rest.*reliev|resting', hpi_body, re.IGNORECASE):
+    if rules.RELIEVED_BY_REST.search(hpi_body):
         relieving.append("rest")
-    if re.search(r'nitrat|nitroglycerin', hpi_body, re.IGNORECASE):
+    if rules.RELIEVED_BY_NITRATES.search(hpi_body):
         relieving.append("nitrates")
     if relieving:
         hpi_modifiers.append(f"relieved by {' and '.join(relieving)}")
@@ -416,22 +391,9 @@ def summarize_medical_text(text):
 
     # Associated symptoms as a separate complete sentence
     assoc = []
-    assoc_map = [
-        (r'shortness of breath|dyspnea',          'shortness of breath'),
-        (r'diaphor|sweating',                     'diaphoresis'),
-        (r'nausea',                               'nausea'),
-        (r'vomiting',                             'vomiting'),
-        (r'palpitations',                         'palpitations'),
-        (r'dizziness|dizzy',                      'dizziness'),
-        (r'syncope|faint',                        'syncope'),
-        (r'orthopnea',                            'orthopnea'),
-        (r'paroxysmal nocturnal dyspnea|pnd\b',  'paroxysmal nocturnal dyspnea'),
-    ]
-    seen_a = set()
-    for pat, lbl in assoc_map:
-        if re.search(pat, hpi_body, re.IGNORECASE) and lbl not in seen_a:
-            assoc.append(lbl)
-            seen_a.add(lbl)
+    for lbl in rules.ASSOCIATED_SYMPTOM_MATCHER.labels(hpi_body):
+        assoc.append(lbl)
+    seen_a = set(assoc)
 
     if assoc:
         if len(assoc) == 1:
@@ -442,12 +404,10 @@ def summarize_medical_text(text):
 
     # Relevant negatives
     negatives = []
-    if 'nausea'    not in seen_a and not re.search(r'\bnausea\b',   hpi_body, re.IGNORECASE):
-        negatives.append("nausea")
-    if 'vomiting'  not in seen_a and not re.search(r'\bvomiting\b', hpi_body, re.IGNORECASE):
-        negatives.append("vomiting")
-    if 'syncope'   not in seen_a and not re.search(r'\bsyncope\b',  hpi_body, re.IGNORECASE):
-        negatives.append("syncope")
+    mentioned = set(rules.NEGATIVE_MATCHER.labels(hpi_body))
+    for _, lbl in rules.NEGATIVE_RULES:
+        if lbl not in seen_a and lbl not in mentioned:
+            negatives.append(lbl)
     if negatives:
         p1_sentence += f" The patient denies {', '.join(negatives)}."
 
@@ -488,9 +448,8 @@ def summarize_medical_text(text):
 
     med_body = sec_text('medications')
     meds_found = []
-    for drug in ['aspirin', 'ibuprofen', 'metoprolol', 'lisinopril', 'atorvastatin', 'metformin', 'amlodipine']:
-        if re.search(drug, med_body + ' ' + text_lower, re.IGNORECASE):
-            meds_found.append(drug.capitalize())
+    for drug in rules.MEDICATION_MATCHER.labels(med_body + ' ' + text_lower):
+        meds_found.append(drug)
     if meds_found:
         p2_sentences.append(f"Current medications include {', '.join(meds_found)}.")
 
@@ -601,121 +560,182 @@ def summarize_medical_text(text):
 
     return "\n\n".join(paragraphs)
 
-def get_entities(text):
+# Normalize entity_group labels — model may use BIO tags or different names
+NER_LABEL_MAP = {
+    # d4data/biomedical-ner-all labels
+    'DISEASE_DISORDER':        'DISEASE_DISORDER',
+    'SIGN_SYMPTOM':            'SIGN_SYMPTOM',
+    'MEDICATION':              'MEDICATION',
+    'DIAGNOSTIC_PROCEDURE':    'DIAGNOSTIC_PROCEDURE',
+    'ANATOMICAL_LOCATION':     'ANATOMICAL_LOCATION',
+    'BIOLOGICAL_STRUCTURE':    'SIGN_SYMPTOM',
+    'CLINICAL_EVENT':          'DIAGNOSTIC_PROCEDURE',
+    # Common alternative naming schemes
+    'Disease_disorder':        'DISEASE_DISORDER',
+    'Sign_symptom':            'SIGN_SYMPTOM',
+    'Medication':              'MEDICATION',
+    'Diagnostic_procedure':    'DIAGNOSTIC_PROCEDURE',
+}
+
+# Default mode: the NER model only sees the first part of each note
+NER_MAX_CHARS = 3000
+
+# Chunked mode: tokens shared by neighbouring windows, so an entity cut at
+# one window edge is seen whole in the next
+NER_WINDOW_STRIDE = 64
+
+def _normalize_ner_output(raw, offset=None):
+    """
+    Convert raw token-classification output for ONE text into the
+    {'word', 'entity_group', 'score'} dicts used throughout the app.
+    When `offset` is given (chunked mode), 'start'/'end' character offsets
+    are kept and shifted by it so they point into the original note.
+    """
+    entities = []
+    for ent in raw:
+        grp = ent.get('entity_group', ent.get('entity', ''))
+        # Strip BIO prefix if present (B-DISEASE_DISORDER → DISEASE_DISORDER)
+        grp_clean = re.sub(r'^[BIS]-', '', grp)
+        normalized = NER_LABEL_MAP.get(grp_clean, grp_clean)
+        entity = {
+            'word':         ent.get('word', ''),
+            'entity_group': normalized,
+            'score':        round(float(ent.get('score', 0)), 3),
+        }
+        if offset is not None and ent.get('start') is not None:
+            entity['start'] = ent['start'] + offset
+            entity['end']   = ent['end'] + offset
+        entities.append(entity)
+    return entities
+
+def _ner_windows(text, ner_pipeline):
+    """
+    Split a note into overlapping (start, end) character spans that each fit
+    the NER model's maximum input length.
+    """
+    tokenizer = ner_pipeline.tokenizer
+    max_len = min(tokenizer.model_max_length,
+                  getattr(ner_pipeline.model.config, 'max_position_embeddings', 512))
+    encoding = tokenizer(
+        text,
+        truncation=True,
+        max_length=max_len,
+        stride=min(NER_WINDOW_STRIDE, max_len // 4),
+        return_overflowing_tokens=True,
+        return_offsets_mapping=True,
+    )
+    windows = []
+    for offsets in encoding['offset_mapping']:
+        # Special tokens map to (0, 0) — skip them
+        spans = [(s, e) for s, e in offsets if e > s]
+        if spans:
+            windows.append((spans[0][0], spans[-1][1]))
+    return windows
+
+def _merge_window_entities(entities):
+    """
+    De-duplicate entities found in overlapping windows. Spans of the same
+    entity group that overlap are collapsed to the widest one (an entity cut
+    at a window edge is always narrower than its full copy), ties going to
+    the higher score. Returns entities in document order.
+    """
+    def span(e):
+        return e.get('start', 0), e.get('end', 0)
+
+    merged = []
+    # Sorted by start, an entity can only overlap the latest one kept for its group
+    last_in_group = {}
+    for ent in sorted(entities, key=lambda e: (span(e)[0], -span(e)[1])):
+        start, end = span(ent)
+        i = last_in_group.get(ent['entity_group'])
+        if i is not None:
+            k_start, k_end = span(merged[i])
+            if start < k_end and k_start < end:
+                if (end - start, ent['score']) > (k_end - k_start, merged[i]['score']):
+                    merged[i] = ent
+                continue
+        last_in_group[ent['entity_group']] = len(merged)
+        merged.append(ent)
+    return sorted(merged, key=lambda e: span(e)[0])
+
+def _rule_based_entities(text):
+    """
+    Comprehensive rule-based clinical NER, used when the model returns nothing.
+    All lexicon terms are found in one pass (see clinical_rules.NER_LEXICON).
+    """
+    return [
+        {'word': entry.label, 'entity_group': entry.category, 'score': entry.weight}
+        for entry, _, _ in rules.NER_LEXICON.find(text)
+    ]
+
+def get_entities(text, chunked=False):
     """
     Extract clinical entities using HuggingFace NER model.
     Falls back to a robust rule-based extractor if the model returns no results.
     Returns a list of dicts with keys: word, entity_group, score
+    With chunked=True the whole note is scanned in overlapping windows instead
+    of only the first NER_MAX_CHARS characters, and each entity also carries
+    'start'/'end' offsets into the note.
     """
-    import re
-    input_text = text[:3000]
-    model_entities = []
+    return get_entities_batch([text], chunked=chunked)[0]
+
+def get_entities_batch(texts, batch_size=16, chunked=False):
+    """
+    Batched version of get_entities for many notes at once.
+    Model inputs (whole notes, or their windows in chunked mode) are sorted
+    by length and fed to the NER pipeline in buckets of `batch_size`, so each
+    forward pass pads to similar-length inputs.
+    Returns one entity list per input text, in input order.
+    """
+    texts = list(texts)
+    model_entities = [[] for _ in texts]
 
     # ── Try HuggingFace NER model ──
     try:
         ner_pipeline = load_ner()
-        raw = ner_pipeline(input_text)
-        # Normalize entity_group labels — model may use BIO tags or different names
-        label_map = {
-            # d4data/biomedical-ner-all labels
-            'DISEASE_DISORDER':        'DISEASE_DISORDER',
-            'SIGN_SYMPTOM':            'SIGN_SYMPTOM',
-            'MEDICATION':              'MEDICATION',
-            'DIAGNOSTIC_PROCEDURE':    'DIAGNOSTIC_PROCEDURE',
-            'ANATOMICAL_LOCATION':     'ANATOMICAL_LOCATION',
-            'BIOLOGICAL_STRUCTURE':    'SIGN_SYMPTOM',
-            'CLINICAL_EVENT':          'DIAGNOSTIC_PROCEDURE',
-            # Common alternative naming schemes
-            'Disease_disorder':        'DISEASE_DISORDER',
-            'Sign_symptom':            'SIGN_SYMPTOM',
-            'Medication':              'MEDICATION',
-            'Diagnostic_procedure':    'DIAGNOSTIC_PROCEDURE',
-        }
-        for ent in raw:
-            grp = ent.get('entity_group', ent.get('entity', ''))
-            # Strip BIO prefix if present (B-DISEASE_DISORDER → DISEASE_DISORDER)
-            grp_clean = re.sub(r'^[BIS]-', '', grp)
-            normalized = label_map.get(grp_clean, grp_clean)
-            model_entities.append({
-                'word':         ent.get('word', ''),
-                'entity_group': normalized,
-                'score':        round(float(ent.get('score', 0)), 3),
-            })
     except Exception:
-        pass
-
-    # ── If model returned entities, use them ──
-    if model_entities:
-        return model_entities
+        ner_pipeline = None
+
+    if ner_pipeline is not None:
+        # (text index, char offset of the piece in its note, piece text)
+        pieces = []
+        for i, text in enumerate(texts):
+            if chunked:
+                try:
+                    windows = _ner_windows(text, ner_pipeline)
+                except Exception:
+                    windows = [(0, min(len(text), NER_MAX_CHARS))]
+                pieces.extend((i, start, text[start:end]) for start, end in windows)
+            else:
+                pieces.append((i, 0, text[:NER_MAX_CHARS]))
 
-    # ── Fallback: comprehensive rule-based clinical NER ──
-    rule_entities = []
-    text_lower = text.lower()
+        order = sorted(range(len(pieces)), key=lambda p: len(pieces[p][2]))
+        for pos in range(0, len(order), batch_size):
+            bucket = order[pos:pos + batch_size]
+            try:
+                raw = ner_pipeline([pieces[p][2] for p in bucket], batch_size=batch_size)
+                for p, ents in zip(bucket, raw):
+                    i, offset, _ = pieces[p]
+                    model_entities[i].extend(_normalize_ner_output(ents, offset if chunked else None))
+            except Exception:
+                pass
 
-    # Problems / Diseases / Symptoms
-    problems_lexicon = [
-        'chest pain', 'hypertension', 'diabetes', 'coronary artery disease',
-        'angina', 'heart failure', 'atrial fibrillation', 'dyspnea',
-        'shortness of breath', 'peptic ulcer', 'asthma', 'copd', 'stroke',
-        'hysterectomy', 'oophorectomy', 'tachycardia', 'bradycardia',
-        'myocardial infarction', 'palpitations', 'syncope', 'edema',
-        'nausea', 'vomiting', 'dizziness', 'headache', 'fever', 'fatigue',
-        'orthopnea', 'diaphoresis', 'cough', 'hemoptysis', 'anemia',
-        'hyperlipidemia', 'obesity', 'cancer', 'pneumonia', 'pleural effusion',
-        'back pain', 'abdominal pain', 'anxiety', 'depression',
-    ]
-    for p in problems_lexicon:
-        if p in text_lower:
-            rule_entities.append({'word': p.title(), 'entity_group': 'DISEASE_DISORDER', 'score': 0.90})
-
-    # Medications
-    meds_lexicon = [
-        'aspirin', 'ibuprofen', 'metoprolol', 'lisinopril', 'atorvastatin',
-        'metformin', 'amlodipine', 'warfarin', 'heparin', 'morphine',
-        'nitroglycerin', 'furosemide', 'cimetidine', 'penicillin', 'amoxicillin',
-        'paracetamol', 'acetaminophen', 'tylenol', 'advil', 'diuretic',
-        'beta blocker', 'ace inhibitor', 'statin', 'nitrate', 'calcium channel',
-    ]
-    for m in meds_lexicon:
-        if m in text_lower:
-            rule_entities.append({'word': m.title(), 'entity_group': 'MEDICATION', 'score': 0.90})
-
-    # Diagnostic procedures / tests
-    tests_lexicon = [
-        'ecg', 'electrocardiogram', 'echocardiogram', 'cardiac catheterization',
-        'x-ray', 'mri', 'ct scan', 'blood test', 'cbc', 'bmp', 'bun',
-        'creatinine', 'cholesterol', 'lipid panel', 'troponin', 'stress test',
-        'angiography', 'ultrasound', 'lab work', 'electrolytes', 'urinalysis',
-        'ventriculogram', 'fundoscopic', 'auscultation', 'percussion',
-    ]
-    for t in tests_lexicon:
-        if t in text_lower:
-            rule_entities.append({'word': t.upper() if len(t) <= 5 else t.title(), 'entity_group': 'DIAGNOSTIC_PROCEDURE', 'score': 0.88})
+        if chunked:
+            model_entities = [_merge_window_entities(ents) for ents in model_entities]
 
-    return rule_entities
+    # ── Use model entities where present, else rule-based fallback ──
+    return [ents or _rule_based_entities(text) for ents, text in zip(model_entities, texts)]
 
 def calculate_risk_score(text):
     text_lower = text.lower()
     score = 0
     triggers = []
 
-    critical_keywords = ['cardiac arrest', 'severe chest pain', 'stroke', 'unconscious', 'rupture', '103 f', '104 f', 'seizure']
-    for k in critical_keywords:
-        if k in text_lower:
-            score += 3
-            triggers.append(f"Critical: {k}")
-
-    urgent_keywords = ['fracture', 'bleeding', 'fever', '101 f', '102 f', 'shortness of breath', 'vomiting', 'severe pain', 'appendicitis']
-    for k in urgent_keywords:
-        if k in text_lower:
-            score += 2
-            triggers.append(f"Urgent: {k}")
-            
-    standard_keywords = ['nausea', 'dizziness', 'cough', 'rash', 'mild', 'headache', 'pain']
-    for k in standard_keywords:
-        if k in text_lower:
-            score += 1
-            
+    for entry, _, _ in rules.RISK_LEXICON.find(text_lower):
+        score += entry.weight
+        if entry.category != 'Standard':
+            triggers.append(f"{entry.category}: {entry.term}")
+
     if score >= 5:
         level = "CRITICAL (Red)"
         action = "🚨 IMMEDIATE ICU ADMISSION / SURGERY REQUIRED"
@@ -740,14 +760,14 @@ def calculate_risk_score(text):
 def answer_question(context, question):
     """
     Answer a clinical question about the patient record using extractive QA.
+    The whole record is searched: its passages are ranked against the
+    question and only the best few are read by the model (see note_qa).
     Returns a string answer with confidence context.
     """
     try:
-        qa_pipeline = load_qa()
-        safe_context = context[:4000]
-        result = qa_pipeline(question=question, context=safe_context)  # type: ignore
-        answer = result.get('answer', '').strip()
-        score  = float(result.get('score', 0))
+        result = note_qa.answer(load_qa(), context, question)
+        answer = result['answer'].strip()
+        score  = result['score']
 
         if not answer or len(answer) < 2:
             return "The model could not find a clear answer in the provided record. Please rephrase your question or check the patient text."
@@ -758,4 +778,301 @@ def answer_question(context, question):
 
         return answer
     except Exception as e:
-        return f"Q&A error: {str(e)}. Please ensure the patient record is loaded and try again."
\ No newline at end of file
+        return f"Q&A error: {str(e)}. Please ensure the patient record is loaded and try again."
+
+# The questions asked about every note in a headless QA run (run_qa_batch)
+STANDARD_QUESTIONS = (
+    "What medications is the patient currently taking?",
+    "What allergies does the patient have?",
+    "What is the diagnosis?",
+    "What is the chief complaint?",
+    "How long have the symptoms lasted?",
+    "What is the blood pressure?",
+    "What is the past medical history?",
+    "What is the family history?",
+    "Does the patient smoke?",
+    "What is the plan?",
+)
+
+def answer_questions(context, questions):
+    """
+    Answer several questions about one patient record in a single batched
+    model run; the record is tokenized once (see note_qa.answer_many).
+    Returns, in question order, dicts with 'question', 'answer', 'score'
+    and 'start'/'end' character offsets into `context`.
+    """
+    return note_qa.answer_many(load_qa(), context, questions)
+
+# --- RESULT CACHE ---
+# Bump when summarize/NER/risk logic changes in a way the rule tables don't show
+ANALYSIS_VERSION = "1"
+
+# Models whose output is cached; part of every cache key
+MODEL_VERSIONS = {
+    'ner': "d4data/biomedical-ner-all",
+}
+
+analysis_cache = ResultCache("analysis")
+
+def normalize_note(text):
+    """Canonical form of a note for hashing: LF line endings, outer whitespace trimmed."""
+    return (text or '').replace('\r\n', '\n').replace('\r', '\n').strip()
+
+def analysis_version(chunked=True):
+    """Everything besides the note itself that decides the analysis result."""
+    models = ','.join(f"{k}={v}" for k, v in sorted(MODEL_VERSIONS.items()))
+    return f"{ANALYSIS_VERSION}|{rules.rules_version()}|{models}|{'chunked' if chunked else 'head'}"
+
+def analysis_key(text, chunked=True):
+    """Cache key for a note: notes that differ only in line endings or outer whitespace share it."""
+    return content_hash(analysis_version(chunked), normalize_note(text))
+
+def _analyze_uncached(texts, batch_size=16, chunked=True):
+    entities = get_entities_batch(texts, batch_size=batch_size, chunked=chunked)
+    return [
+        {
+            'summary':  summarize_medical_text(text),
+            'entities': ents,
+            'risk':     calculate_risk_score(text),
+        }
+        for text, ents in zip(texts, entities)
+    ]
+
+def _store_results(texts, results, chunked):
+    # Rule-based NER fallback stands in for a model that failed to load;
+    # don't pin that result in the cache under the model's version.
+    if not registry.is_loaded('ner'):
+        return
+    version = analysis_version(chunked)
+    for text, result in zip(texts, results):
+        analysis_cache.put(analysis_key(text, chunked), result, version=version)
+
+def analyze_text(text, chunked=True, use_cache=True):
+    """
+    Summary, entities and risk for one note. Results are cached by a hash of
+    the normalized note plus the rule and model versions, so re-analyzing the
+    same note (re-upload, Streamlit rerun, nightly re-run) is a lookup.
+    The note is analyzed as given; only the key is normalized.
+    """
+    text = text or ''
+    if use_cache:
+        cached = analysis_cache.get(analysis_key(text, chunked))
+        if cached is not None:
+            return cached
+
+    result = _analyze_uncached([text], chunked=chunked)[0]
+    if use_cache:
+        _store_results([text], [result], chunked)
+    return result
+
+def purge_stale_cache():
+    """Drop cached analyses computed under older rules or models. Returns rows deleted."""
+    return analysis_cache.invalidate(keep_versions=[analysis_version(True), analysis_version(False)])
+
+# --- BATCH MODE ---
+def _read_jsonl(path):
+    """
+    Stream JSON records from a .jsonl file ('-' reads stdin).
+    Records without an 'id' are numbered by their line in the file.
+    """
+    handle = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line_no, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {'text': record}
+            record.setdefault('id', line_no)
+            yield record
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+# Records read ahead per NER call, so length-sorting has enough notes to bucket
+BATCH_READAHEAD = 8
+
+def _analyze_group(records, batch_size, chunked, use_cache):
+    texts = [record.get('text') or '' for record in records]
+    if not use_cache:
+        results = _analyze_uncached(texts, batch_size=batch_size, chunked=chunked)
+    else:
+        results = [analysis_cache.get(analysis_key(text, chunked)) for text in texts]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fresh = _analyze_uncached([texts[i] for i in missing], batch_size=batch_size, chunked=chunked)
+            _store_results([texts[i] for i in missing], fresh, chunked)
+            for i, result in zip(missing, fresh):
+                results[i] = result
+
+    for record, result in zip(records, results):
+        yield {'id': record['id'], **result}
+
+def analyze_records(records, batch_size=16, chunked=False, use_cache=False):
+    """
+    Run summary, NER and risk triage over an iterable of {'id', 'text'} records.
+    Records are consumed lazily, a few batches at a time, and the NER model
+    sees `batch_size` inputs per call. With chunked=True NER covers the whole
+    of each note (see get_entities). With use_cache=True notes seen before are
+    served from the analysis cache and only the rest reach the models. Yields
+    one result dict per record, in input order.
+    """
+    group = []
+    for record in records:
+        group.append(record)
+        if len(group) >= batch_size * BATCH_READAHEAD:
+            yield from _analyze_group(group, batch_size, chunked, use_cache)
+            group = []
+    if group:
+        yield from _analyze_group(group, batch_size, chunked, use_cache)
+
+def run_batch(input_path, output_path, batch_size=16, progress_every=500, chunked=False, use_cache=False):
+    """
+    Analyze every note in a .jsonl file and write one JSON result per line.
+    Progress and throughput (notes/sec) are reported on stderr.
+    """
+    started = time.perf_counter()
+    count = 0
+    out = sys.stdout if output_path == '-' else open(output_path, 'w', encoding='utf-8')
+    try:
+        results = analyze_records(_read_jsonl(input_path), batch_size=batch_size,
+                                  chunked=chunked, use_cache=use_cache)
+        for result in results:
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            count += 1
+            if progress_every and count % progress_every == 0:
+                elapsed = time.perf_counter() - started
+                print(f"{count} notes · {count / elapsed:.1f} notes/sec", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"Done: {count} notes in {elapsed:.1f}s ({rate:.1f} notes/sec)", file=sys.stderr)
+    stats = {'notes': count, 'seconds': round(elapsed, 3), 'notes_per_second': round(rate, 2)}
+    if use_cache:
+        stats['cache'] = analysis_cache.stats()
+        print(f"Cache hit rate: {stats['cache']['hit_rate']:.1%}", file=sys.stderr)
+    return stats
+
+def _read_questions(path):
+    """One question per non-blank line of a text file."""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def run_qa_batch(output_path, questions=STANDARD_QUESTIONS, start=None, end=None, limit=None,
+                 progress_every=100):
+    """
+    Ask `questions` about every stored note in db_manager's database
+    (optionally only those saved between `start` and `end`, at most
+    `limit`) and write one JSON line per note: its id, created_at and
+    answers. Notes are read from the database in chunks. Progress and
+    throughput are reported on stderr.
+    """
+    import db_manager  # late import: only this command needs the database
+    db_manager.init_db()
+
+    started = time.perf_counter()
+    count = 0
+    records = db_manager.iter_summaries(start=start, end=end, include_text=True)
+    out = sys.stdout if output_path == '-' else open(output_path, 'w', encoding='utf-8')
+    try:
+        for record in itertools.islice(records, limit):
+            result = {
+                'id':         record['id'],
+                'created_at': record['created_at'],
+                'answers':    answer_questions(record['text'], questions),
+            }
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            count += 1
+            if progress_every and count % progress_every == 0:
+                elapsed = time.perf_counter() - started
+                print(f"{count} notes · {count / elapsed:.1f} notes/sec", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"Done: {count} notes × {len(questions)} questions in {elapsed:.1f}s ({rate:.1f} notes/sec)",
+          file=sys.stderr)
+    return {'notes': count, 'questions': len(questions), 'seconds': round(elapsed, 3),
+            'notes_per_second': round(rate, 2)}
+
+# Seconds spent importing this module (heavy dependencies excluded, see above)
+IMPORT_SECONDS = round(time.perf_counter() - _IMPORT_STARTED, 4)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ai_engine", description="Headless clinical NLP tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="Analyze a .jsonl file of notes ({'id', 'text'} per line).")
+    batch.add_argument("--input", required=True, help="Input .jsonl path, or '-' for stdin")
+    batch.add_argument("--output", required=True, help="Output .jsonl path, or '-' for stdout")
+    batch.add_argument("--batch-size", type=int, default=16, help="Notes per NER model batch")
+    batch.add_argument("--progress-every", type=int, default=500, help="Report throughput every N notes (0 = off)")
+    batch.add_argument("--chunked", action="store_true", help="Run NER over the whole note in overlapping windows")
+    batch.add_argument("--cache", action="store_true", help="Reuse cached results for notes analyzed before")
+
+    warm = commands.add_parser("warmup", help="Preload components and report import/load times.")
+    warm.add_argument("--components", nargs="+", default=["ner", "qa"], choices=["ocr"] + registry.registered())
+    warm.add_argument("--budget-mb", type=int, help="Model memory budget (default: CLINICAL_NLP_MODEL_BUDGET_MB or 3072)")
+
+    extract = commands.add_parser("extract", help="Extract text from a PDF or image and report per-page timings.")
+    extract.add_argument("--input", required=True, help="PDF or image path")
+    extract.add_argument("--output", help="Write the extracted text here")
+    extract.add_argument("--workers", type=int, help="OCR worker processes (default: one per CPU)")
+
+    cache = commands.add_parser("cache", help="Inspect or prune the analysis result cache.")
+    cache.add_argument("--purge-stale", action="store_true", help="Delete entries made under older rules/models")
+    cache.add_argument("--clear", action="store_true", help="Delete every cached analysis")
+
+    qa = commands.add_parser("qa", help="Ask the standard question set about every note in the database.")
+    qa.add_argument("--output", required=True, help="Output .jsonl path, or '-' for stdout")
+    qa.add_argument("--db", help="Database path (default: medical_summaries.db)")
+    qa.add_argument("--questions", help="Text file with one question per line (default: STANDARD_QUESTIONS)")
+    qa.add_argument("--start", help="Only notes saved on or after this date (YYYY-MM-DD)")
+    qa.add_argument("--end", help="Only notes saved on or before this date (YYYY-MM-DD)")
+    qa.add_argument("--limit", type=int, help="Stop after this many notes")
+    qa.add_argument("--progress-every", type=int, default=100, help="Report throughput every N notes (0 = off)")
+
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        run_batch(args.input, args.output, batch_size=args.batch_size,
+                  progress_every=args.progress_every, chunked=args.chunked, use_cache=args.cache)
+    elif args.command == "warmup":
+        if args.budget_mb:
+            registry.set_budget(args.budget_mb)
+        print(f"import ai_engine: {IMPORT_SECONDS:.3f}s")
+        for name, seconds in warmup(args.components).items():
+            print(f"load {name}: {seconds:.3f}s")
+        for model in registry.loaded():
+            print(f"resident {model['name']}: {model['memory_mb']:.1f} MB")
+        print(f"total: {registry.memory_bytes() / (1024 * 1024):.1f} MB of {registry.budget_bytes / (1024 * 1024):.0f} MB budget")
+    elif args.command == "extract":
+        file_type = mimetypes.guess_type(args.input)[0] or ""
+        doc = document_extraction.extract_document(args.input, file_type, workers=args.workers)
+        for page in doc['pages']:
+            print(f"page {page.index + 1}: {page.method:<5} {page.seconds:.3f}s  {len(page.text)} chars")
+        print(f"total: {len(doc['pages'])} pages in {doc['seconds']:.3f}s")
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(doc['text'])
+    elif args.command == "qa":
+        if args.db:
+            import db_manager
+            db_manager.DB_NAME = args.db
+        questions = _read_questions(args.questions) if args.questions else STANDARD_QUESTIONS
+        run_qa_batch(args.output, questions, start=args.start, end=args.end, limit=args.limit,
+                     progress_every=args.progress_every)
+    elif args.command == "cache":
+        print(f"current version: {analysis_version()}")
+        if args.clear:
+            print(f"cleared {analysis_cache.invalidate()} entries")
+        elif args.purge_stale:
+            print(f"purged {purge_stale_cache()} stale entries")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,12 @@ import ai_engine
 import db_manager
 import pandas as pd
 import report_gen
+from collections import OrderedDict
+from datetime import date, timedelta
+import hashlib
+import html
+import json
+import tempfile
 
 # ─── Page Config ────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -13,6 +19,32 @@ st.set_page_config(
 )
 db_manager.init_db()
 
+# Triage colours for the traffic chart (match the risk cards)
+RISK_CHART_COLORS = {
+    "CRITICAL":  "#ef4444",
+    "URGENT":    "#f97316",
+    "ROUTINE":   "#22c55e",
+    "UNTRIAGED": "#4f8ef7",
+}
+
+# Where Streamlit supports it, download buttons take a callable and only
+# build the file when clicked
+try:
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    DEFERRED_DOWNLOADS = hasattr(MediaFileManager, 'add_deferred')
+except ImportError:
+    DEFERRED_DOWNLOADS = False
+
+def ward_packet(filters, total):
+    """
+    Consolidated PDF of the matching records, read from the database in
+    chunks and written to an anonymous temp file. Returns the file, rewound.
+    """
+    packet = tempfile.TemporaryFile()
+    report_gen.write_packet(db_manager.iter_summaries(**filters), packet, total)
+    packet.seek(0)
+    return packet
+
 # ─── GLOBAL CSS ─────────────────────────────────────────────────────────────
 st.markdown("""
 <style>
@@ -496,29 +528,103 @@ with st.sidebar:
 
     # Patient Traffic Stats
     st.markdown('<div style="font-size:0.75rem; font-weight:600; color:#4f8ef7; text-transform:uppercase; letter-spacing:0.1em; margin-bottom:0.6rem;">📈 Patient Traffic</div>', unsafe_allow_html=True)
-    stats = db_manager.get_entity_stats()
+    traffic_range = st.selectbox("Range", ["All time", "Last 7 days", "Last 30 days", "Last 90 days"],
+                                 label_visibility="collapsed")
+    range_start = None
+    if traffic_range != "All time":
+        range_start = date.today() - timedelta(days=int(traffic_range.split()[1]) - 1)
+    stats = db_manager.get_entity_stats(start=range_start, by_risk=True)
     if stats:
-        chart_data = pd.DataFrame.from_dict(stats, orient='index', columns=['Count'])
-        st.bar_chart(chart_data, color="#4f8ef7")
+        # One stacked bar per day, coloured by triage level
+        chart_data = pd.DataFrame.from_dict(stats, orient='index').fillna(0).astype(int)
+        buckets = [b for b in db_manager.RISK_BUCKETS if b in chart_data.columns]
+        st.bar_chart(chart_data[buckets], color=[RISK_CHART_COLORS[b] for b in buckets])
     else:
         st.markdown('<div style="font-size:0.8rem; color:rgba(255,255,255,0.4); text-align:center; padding:1rem 0;">No data yet</div>', unsafe_allow_html=True)
 
     st.markdown('<div class="sidebar-divider"></div>', unsafe_allow_html=True)
 
+    # Search
+    st.markdown('<div style="font-size:0.75rem; font-weight:600; color:#4f8ef7; text-transform:uppercase; letter-spacing:0.1em; margin-bottom:0.6rem;">🔎 Search Records</div>', unsafe_allow_html=True)
+    search_query = st.text_input("Search records", placeholder="e.g. chest pain metoprolol", label_visibility="collapsed")
+    if search_query:
+        # Control characters mark the hits so the note text can be escaped before highlighting
+        results = db_manager.search_summaries(search_query, limit=5, highlight=("\x02", "\x03"))
+        for row_id, created_at, risk_level, snippet in results:
+            snippet_html = (html.escape(snippet)
+                            .replace("\x02", '<mark style="background:#4f8ef7; color:#fff; padding:0 2px; border-radius:3px;">')
+                            .replace("\x03", "</mark>")
+                            .replace("\n", " "))
+            st.markdown(f"""
+            <div class="history-item" title="{created_at} · {html.escape(risk_level or 'Not triaged')}">
+                <span style="color:#4f8ef7; font-weight:600;">#{row_id}</span>&nbsp;&nbsp;{snippet_html}
+            </div>
+            """, unsafe_allow_html=True)
+        if not results:
+            st.markdown('<div style="font-size:0.8rem; color:rgba(255,255,255,0.4); text-align:center; padding:0.5rem 0;">No matches</div>', unsafe_allow_html=True)
+
+    st.markdown('<div class="sidebar-divider"></div>', unsafe_allow_html=True)
+
     # Recent History
     st.markdown('<div style="font-size:0.75rem; font-weight:600; color:#4f8ef7; text-transform:uppercase; letter-spacing:0.1em; margin-bottom:0.6rem;">📜 Recent Records</div>', unsafe_allow_html=True)
-    history_data = db_manager.get_all_summaries()
+    # Keyset pagination: history_cursors holds the cursor of every page visited, newest page first
+    if 'history_cursors' not in st.session_state:
+        st.session_state['history_cursors'] = [None]
+    history_data, next_cursor = db_manager.get_history_page(limit=5, cursor=st.session_state['history_cursors'][-1])
     if history_data:
-        for row in history_data[:5]:
-            summary_preview = row[2][:80] + "..." if len(row[2]) > 80 else row[2]
+        for row_id, created_at, summary_preview in history_data:
             st.markdown(f"""
-            <div class="history-item">
-                <span style="color:#4f8ef7; font-weight:600;">#{row[0]}</span>&nbsp;&nbsp;{summary_preview}
+            <div class="history-item" title="{created_at}">
+                <span style="color:#4f8ef7; font-weight:600;">#{row_id}</span>&nbsp;&nbsp;{summary_preview}
             </div>
             """, unsafe_allow_html=True)
+        newer_col, older_col = st.columns(2)
+        if newer_col.button("‹ Newer", disabled=len(st.session_state['history_cursors']) == 1, use_container_width=True):
+            st.session_state['history_cursors'].pop()
+            st.rerun()
+        if older_col.button("Older ›", disabled=next_cursor is None, use_container_width=True):
+            st.session_state['history_cursors'].append(next_cursor)
+            st.rerun()
     else:
         st.markdown('<div style="font-size:0.8rem; color:rgba(255,255,255,0.4); text-align:center; padding:1rem 0;">No history yet</div>', unsafe_allow_html=True)
 
+    st.markdown('<div class="sidebar-divider"></div>', unsafe_allow_html=True)
+
+    # Ward Packet: one PDF with a table of contents for every matching record
+    st.markdown('<div style="font-size:0.75rem; font-weight:600; color:#4f8ef7; text-transform:uppercase; letter-spacing:0.1em; margin-bottom:0.6rem;">🗂️ Ward Packet</div>', unsafe_allow_html=True)
+    packet_range = st.selectbox("Packet range", ["Today", "Last 7 days", "Last 30 days", "All time"],
+                                key="packet_range", label_visibility="collapsed")
+    packet_risks = st.multiselect("Triage levels", list(db_manager.RISK_BUCKETS),
+                                  default=list(db_manager.RISK_BUCKETS), key="packet_risks")
+    packet_filters = {
+        'start': None if packet_range == "All time" else
+                 date.today() - timedelta(days=0 if packet_range == "Today" else int(packet_range.split()[1]) - 1),
+        'risk_buckets': packet_risks,
+    }
+    packet_total = db_manager.count_summaries(**packet_filters) if packet_risks else 0
+    st.caption(f"{packet_total} record{'s' if packet_total != 1 else ''} selected")
+    if packet_total:
+        if DEFERRED_DOWNLOADS:
+            packet_data = lambda: ward_packet(packet_filters, packet_total)  # noqa: E731
+        else:
+            # No deferred downloads: build on request and keep the last packet for this selection
+            packet_key = json.dumps([packet_filters, packet_total], default=str)
+            if st.button("Prepare Ward Packet", use_container_width=True):
+                st.session_state['ward_packet'] = (packet_key, ward_packet(packet_filters, packet_total))
+            prepared = st.session_state.get('ward_packet')
+            packet_data = None
+            if prepared and prepared[0] == packet_key:
+                packet_data = prepared[1]
+                packet_data.seek(0)
+        if packet_data is not None:
+            st.download_button(
+                label="📚 Download Ward Packet",
+                data=packet_data,
+                file_name=f"Ward_Packet_{date.today().isoformat()}.pdf",
+                mime="application/pdf",
+                use_container_width=True,
+            )
+
     st.markdown('<div class="sidebar-divider"></div>', unsafe_allow_html=True)
     st.markdown("""
     <div style="font-size:0.7rem; color:rgba(255,255,255,0.3); text-align:center; margin-top:0.5rem;">
@@ -539,12 +645,38 @@ st.markdown("""
 
 # ─── SESSION STATE ───────────────────────────────────────────────────────────
 for key, default in [
-    ('final_text', ''), ('analyzed', False),
+    ('final_text', ''), ('final_text_partial', False), ('analyzed', False),
     ('risk', None), ('summary', ''), ('entities', []),
     ('qa_answer', ''),
+    ('upload_id', None), ('upload_pages', []), ('upload_done', False),
 ]:
     if key not in st.session_state:
         st.session_state[key] = default
+if 'pdf_cache' not in st.session_state:
+    st.session_state['pdf_cache'] = OrderedDict()
+
+
+# ─── PDF REPORTS ─────────────────────────────────────────────────────────────
+# Reports are built from the analysis results, not on every rerun: each
+# session keeps its most recent PDFs keyed by a hash of their inputs, and
+# where Streamlit supports it the PDF is only built when Download is clicked.
+PDF_CACHE_SIZE = 8
+
+def report_key(summary, risk, entities):
+    payload = json.dumps([summary, risk, entities], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def cached_report(cache, key, summary, risk, entities):
+    """PDF bytes from the session's report cache, building (and evicting the oldest) on a miss."""
+    pdf_bytes = cache.get(key)
+    if pdf_bytes is None:
+        pdf_bytes = report_gen.create_pdf(summary, risk, entities)
+        cache[key] = pdf_bytes
+        while len(cache) > PDF_CACHE_SIZE:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return pdf_bytes
 
 
 # ─── MAIN COLUMNS ────────────────────────────────────────────────────────────
@@ -570,6 +702,7 @@ with col1:
         )
         if text_input:
             st.session_state['final_text'] = text_input
+            st.session_state['final_text_partial'] = False
     else:
         uploaded_file = st.file_uploader(
             "Drop your medical record here",
@@ -577,24 +710,66 @@ with col1:
             label_visibility="collapsed"
         )
         if uploaded_file is not None:
-            with st.spinner("🔍 Extracting text via OCR..."):
-                extracted = ai_engine.extract_text_from_file(uploaded_file)
-                if extracted:
-                    st.session_state['final_text'] = extracted
+            upload_id = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}:{uploaded_file.size}"
+            if st.session_state['upload_id'] != upload_id:
+                # New file — start extraction from page 1
+                st.session_state['upload_id'] = upload_id
+                st.session_state['upload_pages'] = []
+                st.session_state['upload_done'] = False
+
+            # Pages live in session state, so a rerun mid-extraction resumes where it stopped
+            pages = st.session_state['upload_pages']
+            analyze_requested = st.session_state.get('analyze_btn', False)
+
+            if not st.session_state['upload_done'] and not (analyze_requested and pages):
+                try:
+                    total = max(ai_engine.count_pages(uploaded_file), 1)
+                    progress = st.progress(len(pages) / total, text="🔍 Extracting text via OCR...")
+                    live_triage = st.empty()
+                    live_text = st.empty()
+                    for page in ai_engine.iter_extracted_pages(uploaded_file, first_page=len(pages)):
+                        pages.append(page)
+                        partial = ai_engine.pages_to_text(pages, uploaded_file.type)
+                        st.session_state['final_text'] = partial
+                        progress.progress(len(pages) / total,
+                                          text=f"🔍 Extracted page {len(pages)} of {total} ({page.method}, {page.seconds:.1f}s)")
+                        # Rule-based triage is cheap enough to rerun on every page
+                        risk_so_far = ai_engine.calculate_risk_score(partial)
+                        live_triage.caption(f"Preliminary triage, pages 1–{len(pages)}: "
+                                            f"**{risk_so_far['level']}** (score {risk_so_far['score']})")
+                        live_text.code(partial[-1500:], language=None)
+                    st.session_state['upload_done'] = True
+                    progress.empty()
+                    live_triage.empty()
+                    live_text.empty()
+                except Exception as e:
+                    st.error(f"❌ Error reading file: {e}")
+
+            # Until every page is in, the text is only part of the note
+            st.session_state['final_text_partial'] = not st.session_state['upload_done']
+            extracted = ai_engine.pages_to_text(pages, uploaded_file.type)
+            if extracted:
+                st.session_state['final_text'] = extracted
+                if st.session_state['upload_done']:
                     st.success("✅ Text extracted successfully!")
-                    # show extracted text immediately so user doesn't miss it
-                    st.markdown("<div style='margin-top:0.5rem; font-weight:600;'>🔍 Extracted Text:</div>", unsafe_allow_html=True)
-                    st.text_area(
-                        "Extracted Text",
-                        extracted,
-                        height=200,
-                        disabled=True,
-                        label_visibility="hidden",
-                        help="This is the text extracted by OCR. You can copy it if needed."
-                    )
+                else:
+                    # Analyze was pressed mid-extraction: analyze what we have, resume on the next run
+                    st.info(f"⏸️ Extraction paused after page {len(pages)} — the analysis covers these pages "
+                            "and isn't saved to history. Any further interaction resumes extraction.")
+                    st.button("▶️ Resume extraction")
+                # show extracted text immediately so user doesn't miss it
+                st.markdown("<div style='margin-top:0.5rem; font-weight:600;'>🔍 Extracted Text:</div>", unsafe_allow_html=True)
+                st.text_area(
+                    "Extracted Text",
+                    extracted,
+                    height=200,
+                    disabled=True,
+                    label_visibility="hidden",
+                    help="This is the text extracted by OCR. You can copy it if needed."
+                )
 
     st.markdown("<br>", unsafe_allow_html=True)
-    analyze_btn = st.button("🧠 Analyze Record", type="primary", use_container_width=True)
+    analyze_btn = st.button("🧠 Analyze Record", type="primary", use_container_width=True, key="analyze_btn")
     st.markdown('</div>', unsafe_allow_html=True)
 
 
@@ -606,10 +781,16 @@ with col2:
         with st.spinner("🤖 Running Clinical Decision Support Models..."):
             try:
                 text = st.session_state['final_text']
-                summary  = ai_engine.summarize_medical_text(text)
-                entities = ai_engine.get_entities(text)
-                risk     = ai_engine.calculate_risk_score(text)
-                db_manager.save_summary(text, summary)
+                result   = ai_engine.analyze_text(text)  # cached by note content
+                summary  = result['summary']
+                entities = result['entities']
+                risk     = result['risk']
+                if st.session_state['final_text_partial']:
+                    # A partial extraction would pass for the whole note in history and ward packets
+                    st.caption("💾 Not saved to history — extraction hasn't finished. "
+                               "Resume it and analyze again to save the full record.")
+                else:
+                    db_manager.save_summary(text, summary, risk)
 
                 st.session_state['summary']  = summary
                 st.session_state['entities'] = entities
@@ -648,14 +829,17 @@ with col2:
         # ── Tab 1: Summary ───────────────────────────────────────────────
         with tab1:
             st.markdown(st.session_state["summary"])
-            pdf_bytes = report_gen.create_pdf(
-                st.session_state['summary'],
-                st.session_state['risk'],
-                st.session_state['entities']
-            )
+            report_args = (st.session_state['summary'], st.session_state['risk'], st.session_state['entities'])
+            pdf_cache = st.session_state['pdf_cache']
+            pdf_key = report_key(*report_args)
+            if DEFERRED_DOWNLOADS:
+                # Built on click, in Streamlit's download handler (no session state there)
+                pdf_data = lambda: cached_report(pdf_cache, pdf_key, *report_args)  # noqa: E731
+            else:
+                pdf_data = cached_report(pdf_cache, pdf_key, *report_args)
             st.download_button(
                 label="📕 Download Official PDF Report",
-                data=pdf_bytes,
+                data=pdf_data,
                 file_name="Patient_Report.pdf",
                 mime="application/pdf",
                 use_container_width=True,
@@ -711,7 +895,7 @@ with col2:
             if ask_clicked:
                 if question:
                     with st.spinner("💭 Thinking..."):
-                        context = st.session_state['final_text'][:4000]
+                        context = st.session_state['final_text']
                         st.session_state['qa_answer'] = ai_engine.answer_question(context, question)
                 else:
                     st.warning("Please type a question first.")
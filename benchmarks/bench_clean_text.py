@@ -0,0 +1,78 @@
+"""
+Microbenchmark: report_gen.clean_text on long summaries.
+
+Compares the previous implementation (one str.replace per emoji, then a
+latin-1 encode/decode round trip) with the single-pass replacement, on
+plain-ASCII summaries and on summaries carrying the risk-action emoji,
+degree signs and typographic dashes.
+
+    python benchmarks/bench_clean_text.py --chars 20000 --repeat 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import report_gen  # noqa: E402
+import seed_data  # noqa: E402
+
+
+def legacy_clean_text(text):
+    """clean_text as it was before the single-pass rewrite."""
+    if not text:
+        return ""
+    replacements = {
+        "🚨": "[CRITICAL] ",
+        "⚠️": "[URGENT] ",
+        "✅": "[OK] ",
+        "💊": "",
+        "🔬": "",
+        "📈": ""
+    }
+    for emoji, replacement in replacements.items():
+        text = text.replace(emoji, replacement)
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def long_summary(chars, rng, decorated):
+    parts = []
+    while sum(map(len, parts)) < chars:
+        note = seed_data.synthetic_note(rng)
+        if decorated:
+            note = note.replace("Temp: ", "Temp: 38.5°C — ").replace("Plan:", "✅ Plan:")
+            note = rng.choice(["🚨 ", "⚠️ ", ""]) + note
+        parts.append(note)
+    return "\n".join(parts)[:chars]
+
+
+def per_call_us(fn, text, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - started) * 1e6 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, nargs="+", default=[500, 5000, 50000])
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'chars':>7}  {'input':<10}  {'legacy':>10}  {'single pass':>11}  {'speedup':>8}")
+    for chars in args.chars:
+        for decorated in (False, True):
+            text = long_summary(chars, rng, decorated)
+            legacy = per_call_us(legacy_clean_text, text, args.repeat)
+            current = per_call_us(report_gen.clean_text, text, args.repeat)
+            label = "emoji/°C/—" if decorated else "ascii"
+            print(f"{chars:>7}  {label:<10}  {legacy:>8.1f}us  {current:>9.1f}us  {legacy / current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
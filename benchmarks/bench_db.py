@@ -0,0 +1,87 @@
+"""
+Benchmark: history and traffic-stats queries against a large database.
+
+Seeds a throwaway database (N days × ~M patients per day, via
+seed_data.seed_history / db_manager.save_summaries_bulk) unless --db points
+at an existing one, then times the queries the sidebar runs on every page
+render.
+
+    python benchmarks/bench_db.py --days 365 --patients 3000
+    python benchmarks/bench_db.py --db big.db --repeat 50
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db_manager  # noqa: E402
+import seed_data  # noqa: E402
+
+
+def best_ms(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def stats_group_by():
+    """Traffic stats straight from the summaries table (what the rollup replaces)."""
+    with db_manager.connection() as conn:
+        return conn.execute(
+            "SELECT date(created_at, 'unixepoch', 'localtime') AS day, COUNT(*) FROM summaries GROUP BY day"
+        ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Existing database to query (default: seed a temporary one)")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.db:
+        db_manager.DB_NAME = args.db
+        db_manager.init_db()
+    else:
+        db_manager.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+        started = time.perf_counter()
+        rows = seed_data.seed_history(args.days, args.patients, rng=random.Random(args.seed), progress=False)
+        elapsed = time.perf_counter() - started
+        print(f"seeded {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/sec) → {db_manager.DB_NAME}")
+
+    with db_manager.connection() as conn:
+        total = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+    print(f"{total} rows\n")
+
+    _, cursor = db_manager.get_history_page(limit=5)
+    deep_cursor = None
+    for _ in range(100):  # cursor 100 pages in
+        _, deep_cursor = db_manager.get_history_page(limit=5, cursor=deep_cursor)
+        if deep_cursor is None:
+            break
+
+    cases = [
+        ("history page 1 (keyset)",        lambda: db_manager.get_history_page(limit=5)),
+        ("history page 2 (keyset)",        lambda: db_manager.get_history_page(limit=5, cursor=cursor)),
+        ("history page 101 (keyset)",      lambda: db_manager.get_history_page(limit=5, cursor=deep_cursor)),
+        ("stats, all time (rollup)",       lambda: db_manager.get_entity_stats()),
+        ("stats by risk, 30 days (rollup)", lambda: db_manager.get_entity_stats(
+            start=time.strftime('%Y-%m-%d', time.localtime(time.time() - 29 * 86400)), by_risk=True)),
+        ("stats, all time (GROUP BY)",     stats_group_by),
+    ]
+    for label, fn in cases:
+        print(f"{label:<34} {best_ms(fn, args.repeat):>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Microbenchmark: keyword lookup cost as the lexicon grows.
+
+Compares the old approach (`term in text` for every term) with
+clinical_rules.LexiconIndex (one Aho–Corasick pass) for lexicons of
+synthetic drug-like names on synthetic notes.
+
+    python benchmarks/bench_lexicon.py --sizes 100 5000 50000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import clinical_rules  # noqa: E402
+import seed_data  # noqa: E402
+
+
+def fake_terms(n, rng):
+    """Drug-like lowercase names, e.g. 'zolvapranex'."""
+    return {''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 14))) for _ in range(n)}
+
+
+def per_note_ms(fn, notes):
+    started = time.perf_counter()
+    for note in notes:
+        fn(note)
+    return (time.perf_counter() - started) * 1000 / len(notes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 5000, 50000])
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    notes = [seed_data.synthetic_note(rng) for _ in range(args.notes)]
+
+    print(f"{'terms':>8}  {'substring loop':>16}  {'LexiconIndex':>14}  {'build':>9}")
+    for size in args.sizes:
+        terms = sorted(fake_terms(size, rng))
+
+        def substring_loop(note):
+            lower = note.lower()
+            return [t for t in terms if t in lower]
+
+        started = time.perf_counter()
+        index = clinical_rules.LexiconIndex()
+        index.add_terms(terms, 'MEDICATION')
+        index.find("")  # build the automaton outside the timed loop
+        build_s = time.perf_counter() - started
+
+        loop_ms = per_note_ms(substring_loop, notes)
+        index_ms = per_note_ms(index.find, notes)
+        print(f"{size:>8}  {loop_ms:>13.3f} ms  {index_ms:>11.3f} ms  {build_s:>7.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: OCR time and character accuracy with and without preprocessing.
+
+By default renders synthetic notes as 12 MP "phone photos" (tinted paper,
+noise, JPEG artefacts, no DPI metadata) and OCRs each one raw and after
+document_extraction.preprocess_for_ocr. Real scans can be used instead:
+point --images at a folder of page images, each with a same-named .txt
+file holding its ground truth.
+
+    python benchmarks/bench_ocr.py --pages 5
+    python benchmarks/bench_ocr.py --images ~/scans
+
+Requires the tesseract binary (see README).
+"""
+import argparse
+import difflib
+import glob
+import io
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import document_extraction  # noqa: E402
+import seed_data  # noqa: E402
+
+
+def render_photo(text, rng, size=(3000, 4000)):
+    """A 12 MP photo of `text` printed on a page: off-white paper, sensor noise, JPEG."""
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+    paper = tuple(rng.randint(185, 225) for _ in range(3))
+    image = Image.new('RGB', size, paper)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=size[0] // 45)
+    y = size[1] // 12
+    for line in text.split('\n'):
+        draw.text((size[0] // 12, y), line, font=font, fill=(45, 45, 55))
+        y += int(font.size * 1.5)
+
+    noise = Image.effect_noise(size, 18).convert('RGB')
+    image = Image.blend(image, noise, 0.12).filter(ImageFilter.GaussianBlur(1.2))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=70)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def synthetic_pages(count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        text = seed_data.synthetic_note(rng)
+        yield render_photo(text, rng), text
+
+
+def folder_pages(path):
+    from PIL import Image
+
+    for image_path in sorted(glob.glob(os.path.join(path, '*'))):
+        truth_path = os.path.splitext(image_path)[0] + '.txt'
+        if image_path.endswith('.txt') or not os.path.exists(truth_path):
+            continue
+        with open(truth_path, encoding='utf-8') as f:
+            yield Image.open(image_path), f.read()
+
+
+def char_accuracy(ocr_text, truth):
+    """Similarity of the OCR text to the ground truth, ignoring whitespace layout."""
+    return difflib.SequenceMatcher(None, ' '.join(ocr_text.split()), ' '.join(truth.split()), autojunk=False).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5, help="Synthetic pages to render")
+    parser.add_argument("--images", help="Folder of page images with same-named .txt ground truth")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    pages = folder_pages(args.images) if args.images else synthetic_pages(args.pages, args.seed)
+
+    totals = {False: [0.0, 0.0], True: [0.0, 0.0]}
+    count = 0
+    print(f"{'page':>4}  {'pixels':>10}  {'raw s':>7}  {'raw acc':>7}  {'prep s':>7}  {'prep acc':>8}")
+    for image, truth in pages:
+        row = []
+        for preprocess in (False, True):
+            started = time.perf_counter()
+            text = document_extraction.ocr_image(image, preprocess=preprocess)
+            seconds = time.perf_counter() - started
+            accuracy = char_accuracy(text, truth)
+            totals[preprocess][0] += seconds
+            totals[preprocess][1] += accuracy
+            row += [seconds, accuracy]
+        count += 1
+        print(f"{count:>4}  {image.width * image.height:>10}  {row[0]:>7.2f}  {row[1]:>7.1%}  {row[2]:>7.2f}  {row[3]:>8.1%}")
+
+    if not count:
+        print("No pages to benchmark.")
+        return
+    raw_s, raw_acc = totals[False]
+    prep_s, prep_acc = totals[True]
+    print(f"\nraw:          {raw_s / count:.2f} s/page, {raw_acc / count:.1%} char accuracy")
+    print(f"preprocessed: {prep_s / count:.2f} s/page, {prep_acc / count:.1%} char accuracy")
+    print(f"speedup:      {raw_s / prep_s:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Microbenchmark: per-note latency of ai_engine.summarize_medical_text on a
+corpus of synthetic notes.
+
+    python benchmarks/bench_summarizer.py --notes 2000
+    python benchmarks/bench_summarizer.py --notes 2000 --baseline HEAD~1
+
+--baseline loads ai_engine.py from another git revision and times it on the
+same corpus, so "before" and "after" numbers come from one run. The two
+implementations must produce identical summaries; mismatches are reported.
+"""
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import seed_data  # noqa: E402
+
+
+def load_revision(rev):
+    """Import ai_engine.py as it was at git revision `rev`."""
+    source = subprocess.run(
+        ["git", "show", f"{rev}:ai_engine.py"], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    path = os.path.join(tempfile.mkdtemp(), "ai_engine_baseline.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source)
+    spec = importlib.util.spec_from_file_location("ai_engine_baseline", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def time_per_note(summarize, notes, repeat):
+    """Best-of-`repeat` latency for each note, in milliseconds."""
+    latencies = []
+    outputs = []
+    for note in notes:
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            out = summarize(note)
+            best = min(best, time.perf_counter() - started)
+        latencies.append(best * 1000)
+        outputs.append(out)
+    return latencies, outputs
+
+
+def report(name, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{name:<10} mean {statistics.mean(ordered):7.3f} ms   p50 {statistics.median(ordered):7.3f} ms   "
+          f"p95 {p95:7.3f} ms   ({1000 / statistics.mean(ordered):,.0f} notes/sec)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=1000, help="Synthetic notes in the corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per note; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", help="Git revision to compare against (e.g. HEAD~1)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    notes = [seed_data.synthetic_note(rng) for _ in range(args.notes)]
+    print(f"Corpus: {len(notes)} notes, mean {statistics.mean(map(len, notes)):.0f} chars")
+
+    import ai_engine
+    current, current_out = time_per_note(ai_engine.summarize_medical_text, notes, args.repeat)
+
+    if args.baseline:
+        baseline_module = load_revision(args.baseline)
+        before, before_out = time_per_note(baseline_module.summarize_medical_text, notes, args.repeat)
+        report("before", before)
+        report("after", current)
+        print(f"speedup    {statistics.mean(before) / statistics.mean(current):.2f}x")
+        mismatches = sum(a != b for a, b in zip(before_out, current_out))
+        print(f"identical  {len(notes) - mismatches}/{len(notes)} summaries")
+    else:
+        report("current", current)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+"""
+Compiled rule registry for the rule-based parts of ai_engine.
+
+Every pattern used by summarize_medical_text lives here and is compiled once
+at import, so summarizing a note never rebuilds a rule table or re-parses a
+regex. The keyword lexicons behind the rule-based NER fallback and the risk
+triage are held in Aho–Corasick indexes, found in one pass over the text.
+"""
+from collections import deque, namedtuple
+import functools
+import hashlib
+import re
+
+try:  # Python 3.11+
+    import re._constants as _sre
+    import re._parser as _sre_parse
+except ImportError:
+    import sre_constants as _sre
+    import sre_parse as _sre_parse
+
+_I = re.IGNORECASE
+
+
+def _table(rules, flags=_I):
+    """Compile a [(pattern, label), ...] table into [(compiled, label), ...]."""
+    return [(re.compile(pattern, flags), label) for pattern, label in rules]
+
+
+def _first_chars(items):
+    """
+    Characters a parsed regex can start with, or None when that cannot be
+    pinned down (character categories, optional prefixes, empty branches...).
+    """
+    for op, av in items:
+        if op is _sre.AT:
+            continue  # anchors like \b are zero-width
+        if op is _sre.LITERAL:
+            return {chr(av)}
+        if op is _sre.IN:
+            chars = set()
+            for kind, value in av:
+                if kind is _sre.LITERAL:
+                    chars.add(chr(value))
+                elif kind is _sre.RANGE and value[1] - value[0] < 256:
+                    chars.update(map(chr, range(value[0], value[1] + 1)))
+                else:
+                    return None
+            return chars
+        if op is _sre.BRANCH:
+            chars = set()
+            for branch in av[1]:
+                branch_chars = _first_chars(branch)
+                if branch_chars is None:
+                    return None
+                chars |= branch_chars
+            return chars
+        if op is _sre.SUBPATTERN:
+            return _first_chars(av[-1])
+        return None
+    return None
+
+
+class MultiPatternMatcher:
+    """
+    Finds every rule of a [(compiled, label), ...] table in one scan of the text.
+
+    All rules are joined into a single alternation (the scanner), guarded by a
+    lookahead on the characters any rule can start with so the regex engine
+    skips everything else without trying each branch. The scan only stops
+    where at least one rule matches; there a probe made of one optional
+    lookahead per rule reports, in a single call, every rule that matches at
+    that position — so rules that share a start (e.g. 'family.*diabetes' and
+    'family.*cancer') are all caught. The span reported for each rule is
+    exactly what pattern.search() would return on its own.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        flags = table[0][0].flags if table else 0
+        alternation = '|'.join(f'(?:{pattern.pattern})' for pattern, _ in table)
+
+        starts = set()
+        for pattern, _ in table:
+            chars = _first_chars(_sre_parse.parse(pattern.pattern, flags))
+            if chars is None:
+                starts = None
+                break
+            starts |= chars
+        if starts:
+            alternation = f"(?=[{''.join(map(re.escape, sorted(starts)))}])(?:{alternation})"
+
+        self._scanner = re.compile(alternation, flags)
+        self._probe = re.compile(
+            ''.join(f'(?=(?P<r{i}>{pattern.pattern}))?' for i, (pattern, _) in enumerate(table)), flags
+        )
+
+    def find(self, text):
+        """
+        Return [(label, start, end), ...] for every rule that matches `text`,
+        in table order, using each rule's first (leftmost) match.
+        """
+        found = {}
+        pos = 0
+        while len(found) < len(self.table):
+            m = self._scanner.search(text, pos)
+            if not m:
+                break
+            hits = self._probe.match(text, m.start())
+            for name, value in hits.groupdict().items():
+                if value is not None:
+                    found.setdefault(int(name[1:]), hits.span(name))
+            pos = m.start() + 1
+        return [(self.table[i][1],) + found[i] for i in sorted(found)]
+
+    def labels(self, text):
+        """Matching labels in table order, each listed once."""
+        return list(dict.fromkeys(label for label, _, _ in self.find(text)))
+
+
+# ─────────────────────────────────────────────────────────────
+# STEP 1: SECTION SEGMENTATION
+# Checked in order — the first header that matches a line wins
+# ─────────────────────────────────────────────────────────────
+SECTION_HEADERS = [(section, re.compile(pattern, _I)) for section, pattern in [
+    ('hpi',        r'history of present illness|hpi'),
+    ('pmh',        r'past medical history|past surgical|medical history|surgical\s*[-–]'),
+    ('fhx',        r'family history'),
+    ('social',     r'social history'),
+    ('ros',        r'review of systems'),
+    ('vitals',     r'vital signs'),
+    ('physical',   r'physical examination|general:'),
+    ('assessment', r'assessment|differential diagnosis|impression'),
+    ('plan',       r'^plan\s*:'),
+    ('allergies',  r'allerg'),
+    ('medications',r'medication'),
+]]
+
+# ─────────────────────────────────────────────────────────────
+# STEP 2: DEMOGRAPHICS
+# ─────────────────────────────────────────────────────────────
+PATIENT_NAME = re.compile(r'patient\s*name\s*:\s*([A-Za-z,\s]+)', _I)
+AGE_SEX      = re.compile(r'(\d{1,3})\s*[-–]?\s*y(?:ear)?(?:s)?[\s/-]*o(?:ld)?\s+([A-Za-z]+)', _I)
+
+# ─────────────────────────────────────────────────────────────
+# STEP 3: CHIEF COMPLAINT & HPI
+# ─────────────────────────────────────────────────────────────
+DURATION        = re.compile(r'(\d+)\s*[-–]?\s*(day|week|month|year|hour)s?', _I)
+CHIEF_COMPLAINT = re.compile(r'chief complaint\s*[&:]\s*(?:id\s*:)?\s*(.+)', _I)
+CHIEF_SYMPTOM   = re.compile(
+    r'(chest pain|shortness of breath|dyspnea|abdominal pain|headache|'
+    r'fever|cough|nausea|vomiting|dizziness|palpitations)', _I
+)
+RADIATION       = re.compile(r'radiates?\s+(?:to|up to|down to|into)\s+(?:the\s+)?([a-z\s]+)', _I)
+PAIN_CHARACTER  = re.compile(r'(dull|sharp|aching|burning|stabbing|pressure|squeezing|tightness|throbbing)', _I)
+
+SYMPTOM_RULES = _table([
+    (r'exertional|on exertion',                    'exertional'),
+    (r'radiates?(?:d)? to|radiation to',           'radiating'),
+    (r'shortness of breath|dyspnea',               'shortness of breath'),
+    (r'diaphor|sweating',                          'diaphoresis'),
+    (r'nausea',                                    'nausea'),
+    (r'vomiting',                                  'vomiting'),
+    (r'palpitations',                              'palpitations'),
+    (r'dizziness|dizzy',                           'dizziness'),
+    (r'syncope|faint',                             'syncope'),
+    (r'sob|shortness',                             'SOB'),
+    (r'orthopnea',                                 'orthopnea'),
+    (r'paroxysmal nocturnal',                      'PND'),
+])
+
+# ─────────────────────────────────────────────────────────────
+# STEP 4: PAST MEDICAL & SURGICAL HISTORY
+# ─────────────────────────────────────────────────────────────
+CONDITION_RULES = _table([
+    (r'\bhypertension\b|\bhtn\b',                          'Hypertension'),
+    (r'\bdiabetes\b|\bdm\s*(?:type\s*)?\d?\b|\bt2dm\b',   'Diabetes mellitus'),
+    (r'\basthma\b',                                        'Asthma'),
+    (r'\bcopd\b|chronic obstructive',                      'COPD'),
+    (r'\batrial fibrillation\b|\bafib\b|\baf\b',           'Atrial fibrillation'),
+    (r'\bcad\b|coronary artery disease',                   'Coronary artery disease (CAD)'),
+    (r'\bheart failure\b|\bchf\b',                         'Congestive heart failure'),
+    (r'\bstroke\b|\bcva\b',                                'Prior stroke/CVA'),
+    (r'\bhyperlipidemia\b|\bdyslipidemia\b|\bhigh cholesterol\b', 'Hyperlipidemia'),
+    (r'\bpeptic ulcer\b|\bpud\b',                          'Peptic ulcer disease'),
+    (r'\brenal\b.*\bfailure\b|\bckd\b',                   'Chronic kidney disease'),
+    (r'\bhypothyroidism\b|\bthyroid\b',                    'Thyroid disease'),
+    (r'\bosteoporosis\b',                                  'Osteoporosis'),
+    (r'\banemia\b',                                        'Anemia'),
+    (r'\bgerd\b|gastro.esophageal reflux',                 'GERD'),
+    (r'\bhysterectomy\b',                                  'Hysterectomy (surgical)'),
+    (r'\boophorectomy\b|\bbso\b',                          'Oophorectomy (surgical)'),
+    (r'\bappendectomy\b',                                   'Appendectomy (surgical)'),
+    (r'\bcholecystectomy\b',                               'Cholecystectomy (surgical)'),
+    (r'\bbunionectomy\b',                                  'Bunionectomy (surgical)'),
+    (r'\bmenopause\b|surgical menopause',                  'Surgical menopause'),
+    (r'\bpenicillin\b.*\ballerg|\ballerg.*\bpenicillin',   'Penicillin allergy'),
+])
+
+# Year lookup in the window around a condition match
+YEARS_AGO     = re.compile(r'(\d{1,2})\s*(?:year|yr)s?\s*ago', _I)
+ABSOLUTE_YEAR = re.compile(r'\b(19|20)\d{2}\b')
+
+# ─────────────────────────────────────────────────────────────
+# STEP 5: FAMILY HISTORY
+# ─────────────────────────────────────────────────────────────
+FAMILY_HISTORY_RULES = _table([
+    (r'premature\s+cad|early\s+(?:ascvd|cad|heart)',     'premature CAD'),
+    (r'(?:father|mother|brother|sister|parent).*heart attack|mi', 'family MI'),
+    (r'family.*coronary|coronary.*family',                'coronary artery disease'),
+    (r'family.*diabetes',                                 'diabetes'),
+    (r'family.*hypertension',                             'hypertension'),
+    (r'family.*cancer',                                   'cancer'),
+    (r'family.*stroke',                                   'stroke'),
+])
+
+# ─────────────────────────────────────────────────────────────
+# STEP 6: SOCIAL HISTORY
+# ─────────────────────────────────────────────────────────────
+NON_SMOKER  = re.compile(r'non[- ]?smok|no\s+tobacco|tobacco\s*use\s*:\s*none|does not smoke', _I)
+SMOKER      = re.compile(r'smok|tobacco', _I)
+PACK_YEARS  = re.compile(r'(\d+)\s*pack', _I)
+NON_DRINKER = re.compile(r'denies\s+alcohol|no\s+alcohol|alcohol.*none', _I)
+DRINKER     = re.compile(r'alcohol|beer|wine|drink', _I)
+NO_HRT      = re.compile(r'not on hormone|no hormone replacement|no hrt', _I)
+
+# ─────────────────────────────────────────────────────────────
+# STEP 7: VITALS
+# ─────────────────────────────────────────────────────────────
+BLOOD_PRESSURE = re.compile(r'blood pressure\s*:?\s*(\d+/\d+)|bp\s*:?\s*(\d+/\d+)', _I)
+PULSE          = re.compile(r'pulse\s*:?\s*(\d+)|heart rate\s*:?\s*(\d+)', _I)
+TEMPERATURE    = re.compile(r'temp(?:erature)?\s*:?\s*([\d.]+)', _I)
+RESPIRATION    = re.compile(r'respiration\s*:?\s*(\d+)|rr\s*:?\s*(\d+)', _I)
+SPO2           = re.compile(r'spo2\s*:?\s*(\d+)%?|o2\s*sat\s*:?\s*(\d+)', _I)
+
+# ─────────────────────────────────────────────────────────────
+# STEP 8: KEY EXAM FINDINGS
+# ─────────────────────────────────────────────────────────────
+EXAM_RULES = _table([
+    (r'murmur',                              'Cardiac murmur noted'),
+    (r'third heart sound|s3\b',              'S3 heart sound present'),
+    (r'fourth heart sound|s4\b',             'S4 heart sound present'),
+    (r'crackle|rale',                        'Pulmonary crackles'),
+    (r'wheez',                               'Wheezing'),
+    (r'bruit',                               'Abdominal bruit'),
+    (r'edema',                               'Peripheral edema'),
+    (r'jugular venous|jvp|jvd',              'Elevated JVP'),
+    (r'hepatomegaly|liver.*enlarg',          'Hepatomegaly'),
+])
+
+# ─────────────────────────────────────────────────────────────
+# STEP 9: ASSESSMENT
+# ─────────────────────────────────────────────────────────────
+ASSESSMENT_ITEM = re.compile(r'^\s*\d+\.\s+(.+)', re.MULTILINE)
+
+# ─────────────────────────────────────────────────────────────
+# STEP 10: NARRATIVE MODIFIERS
+# ─────────────────────────────────────────────────────────────
+AGGRAVATED_BY_EXERTION = re.compile(r'exertional|on exertion|walking|working|physical activity', _I)
+AGGRAVATED_BY_REST     = re.compile(r'lying|recumbent|at rest during sleep|nocturnal', _I)
+RELIEVED_BY_REST       = re.compile(r'relieved.*rest|resolved.*rest|rest.*reliev|resting', _I)
+RELIEVED_BY_NITRATES   = re.compile(r'nitrat|nitroglycerin', _I)
+
+ASSOCIATED_SYMPTOM_RULES = _table([
+    (r'shortness of breath|dyspnea',          'shortness of breath'),
+    (r'diaphor|sweating',                     'diaphoresis'),
+    (r'nausea',                               'nausea'),
+    (r'vomiting',                             'vomiting'),
+    (r'palpitations',                         'palpitations'),
+    (r'dizziness|dizzy',                      'dizziness'),
+    (r'syncope|faint',                        'syncope'),
+    (r'orthopnea',                            'orthopnea'),
+    (r'paroxysmal nocturnal dyspnea|pnd\b',  'paroxysmal nocturnal dyspnea'),
+])
+
+# Relevant negatives — reported as denied when absent from the HPI
+NEGATIVE_RULES = _table([
+    (r'\bnausea\b',   'nausea'),
+    (r'\bvomiting\b', 'vomiting'),
+    (r'\bsyncope\b',  'syncope'),
+])
+
+MEDICATION_RULES = _table([
+    (drug, drug.capitalize())
+    for drug in ['aspirin', 'ibuprofen', 'metoprolol', 'lisinopril', 'atorvastatin', 'metformin', 'amlodipine']
+])
+
+# ─────────────────────────────────────────────────────────────
+# SINGLE-PASS MATCHERS
+# One scan of the text per lexicon instead of one scan per rule
+# ─────────────────────────────────────────────────────────────
+SYMPTOM_MATCHER            = MultiPatternMatcher(SYMPTOM_RULES)
+CONDITION_MATCHER          = MultiPatternMatcher(CONDITION_RULES)
+FAMILY_HISTORY_MATCHER     = MultiPatternMatcher(FAMILY_HISTORY_RULES)
+EXAM_MATCHER               = MultiPatternMatcher(EXAM_RULES)
+ASSOCIATED_SYMPTOM_MATCHER = MultiPatternMatcher(ASSOCIATED_SYMPTOM_RULES)
+NEGATIVE_MATCHER           = MultiPatternMatcher(NEGATIVE_RULES)
+MEDICATION_MATCHER         = MultiPatternMatcher(MEDICATION_RULES)
+
+
+# ─────────────────────────────────────────────────────────────
+# KEYWORD LEXICONS (rule-based NER fallback + risk triage)
+# ─────────────────────────────────────────────────────────────
+LexiconEntry = namedtuple('LexiconEntry', 'term category weight label')
+
+
+class LexiconIndex:
+    """
+    Aho–Corasick automaton over a lexicon of plain-substring terms.
+
+    Every term carries a category, a weight and a display label. One pass
+    over the text finds every term it contains, whatever the lexicon size,
+    so lookups cost the same with 100 terms or 50k. Matching is
+    case-insensitive and has the same semantics as `term in text.lower()`.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._automaton = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, term, category, weight=1, label=None):
+        """Add one term. The automaton is rebuilt on the next lookup."""
+        term = term.lower()
+        self._entries.append(LexiconEntry(term, category, weight, term if label is None else label))
+        self._automaton = None
+
+    def add_terms(self, terms, category, weight=1, label=None):
+        """
+        Add many terms of one category, e.g. a formulary export.
+        `label` may be a function of the term that returns its display label.
+        """
+        for term in terms:
+            self.add(term, category, weight, label(term) if callable(label) else label)
+
+    def _build(self):
+        goto, fail, out = [{}], [0], [[]]
+        for idx, entry in enumerate(self._entries):
+            node = 0
+            for ch in entry.term:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = goto[node][ch] = len(goto)
+                    goto.append({})
+                    fail.append(0)
+                    out.append([])
+                node = nxt
+            out[node].append(idx)
+
+        # Breadth-first: fail links point at the longest proper suffix in the trie
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                queue.append(child)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(ch, 0) if node else 0
+                out[child] = out[child] + out[fail[child]]
+        self._automaton = (goto, fail, out)
+        return self._automaton
+
+    def find(self, text):
+        """
+        Return one (entry, start, end) per term found in `text` — its first
+        occurrence — in the order the terms were added.
+        """
+        goto, fail, out = self._automaton or self._build()
+        first = {}
+        node = 0
+        for i, ch in enumerate(text.lower()):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for idx in out[node]:
+                if idx not in first:
+                    first[idx] = i + 1
+        entries = self._entries
+        return [(entries[idx], first[idx] - len(entries[idx].term), first[idx]) for idx in sorted(first)]
+
+
+def _test_label(term):
+    return term.upper() if len(term) <= 5 else term.title()
+
+
+# Rule-based NER fallback: weight is the confidence reported for a hit
+NER_LEXICON = LexiconIndex()
+NER_LEXICON.add_terms([
+    'chest pain', 'hypertension', 'diabetes', 'coronary artery disease',
+    'angina', 'heart failure', 'atrial fibrillation', 'dyspnea',
+    'shortness of breath', 'peptic ulcer', 'asthma', 'copd', 'stroke',
+    'hysterectomy', 'oophorectomy', 'tachycardia', 'bradycardia',
+    'myocardial infarction', 'palpitations', 'syncope', 'edema',
+    'nausea', 'vomiting', 'dizziness', 'headache', 'fever', 'fatigue',
+    'orthopnea', 'diaphoresis', 'cough', 'hemoptysis', 'anemia',
+    'hyperlipidemia', 'obesity', 'cancer', 'pneumonia', 'pleural effusion',
+    'back pain', 'abdominal pain', 'anxiety', 'depression',
+], 'DISEASE_DISORDER', 0.90, str.title)
+NER_LEXICON.add_terms([
+    'aspirin', 'ibuprofen', 'metoprolol', 'lisinopril', 'atorvastatin',
+    'metformin', 'amlodipine', 'warfarin', 'heparin', 'morphine',
+    'nitroglycerin', 'furosemide', 'cimetidine', 'penicillin', 'amoxicillin',
+    'paracetamol', 'acetaminophen', 'tylenol', 'advil', 'diuretic',
+    'beta blocker', 'ace inhibitor', 'statin', 'nitrate', 'calcium channel',
+], 'MEDICATION', 0.90, str.title)
+NER_LEXICON.add_terms([
+    'ecg', 'electrocardiogram', 'echocardiogram', 'cardiac catheterization',
+    'x-ray', 'mri', 'ct scan', 'blood test', 'cbc', 'bmp', 'bun',
+    'creatinine', 'cholesterol', 'lipid panel', 'troponin', 'stress test',
+    'angiography', 'ultrasound', 'lab work', 'electrolytes', 'urinalysis',
+    'ventriculogram', 'fundoscopic', 'auscultation', 'percussion',
+], 'DIAGNOSTIC_PROCEDURE', 0.88, _test_label)
+
+# Risk triage: weight is the points a keyword adds to the risk score
+RISK_LEXICON = LexiconIndex()
+RISK_LEXICON.add_terms(['cardiac arrest', 'severe chest pain', 'stroke', 'unconscious', 'rupture',
+                        '103 f', '104 f', 'seizure'], 'Critical', 3)
+RISK_LEXICON.add_terms(['fracture', 'bleeding', 'fever', '101 f', '102 f', 'shortness of breath',
+                        'vomiting', 'severe pain', 'appendicitis'], 'Urgent', 2)
+RISK_LEXICON.add_terms(['nausea', 'dizziness', 'cough', 'rash', 'mild', 'headache', 'pain'], 'Standard', 1)
+
+
+# ─────────────────────────────────────────────────────────────
+# VERSIONING
+# ─────────────────────────────────────────────────────────────
+def _fingerprint_parts():
+    for name, value in sorted(globals().items()):
+        if isinstance(value, re.Pattern):
+            yield f'{name}:{value.flags}:{value.pattern}'
+        elif isinstance(value, list) and value and isinstance(value[0], tuple):
+            for row in value:
+                yield name + ':' + '|'.join(item.pattern if isinstance(item, re.Pattern) else str(item) for item in row)
+        elif isinstance(value, LexiconIndex):
+            for entry in value._entries:
+                yield f'{name}:' + '|'.join(map(str, entry))
+
+
+@functools.lru_cache(maxsize=8)
+def _rules_version(lexicon_sizes):
+    digest = hashlib.sha256()
+    for part in _fingerprint_parts():
+        digest.update(part.encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def rules_version():
+    """
+    Short hash of every rule table and lexicon in this module. It changes
+    whenever a pattern, label or lexicon term changes, so results cached
+    under an older version can be told apart.
+    """
+    # Lexicons only grow at runtime, so their sizes are enough to notice additions
+    return _rules_version((len(NER_LEXICON), len(RISK_LEXICON)))
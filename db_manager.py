@@ -1,67 +1,603 @@
+import hashlib
+import os
+import re
 import sqlite3
-from datetime import datetime
-from collections import Counter
+import threading
+import time
+from contextlib import contextmanager
+
+from note_compression import compress_text, decompress_text
 
 # Name of our database file
 DB_NAME = "medical_summaries.db"
 
-def init_db():
+# --- CONNECTION POOL ---
+# Streamlit reruns the script on every interaction and serves many sessions
+# from one process, so connections are opened once and reused. WAL lets
+# readers run alongside a writer; the busy timeout makes a writer wait for
+# the lock instead of failing with "database is locked".
+POOL_SIZE = 8              # idle connections kept per database file
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 16384      # page cache per connection
+
+class ConnectionPool:
     """
-    Creates the database and the table if they don't exist.
+    Thread-safe pool of SQLite connections to one database file.
+    Use `with pool.connection() as conn:` — the block commits on success
+    and rolls back on error, then the connection goes back to the pool.
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS summaries (
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')  # durable at checkpoints; safe with WAL
+        conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def _acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked child (e.g. an OCR worker): never reuse the parent's connections
+                self._idle, self._pid = [], os.getpid()
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _release(self, conn):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool():
+    """The pool for the current DB_NAME (one per database file)."""
+    with _pools_lock:
+        pool = _pools.get(DB_NAME)
+        if pool is None:
+            pool = _pools[DB_NAME] = ConnectionPool(DB_NAME)
+        return pool
+
+def connection():
+    """Borrow a pooled connection: `with db_manager.connection() as conn: ...`"""
+    return get_pool().connection()
+
+# --- RISK BUCKETS ---
+# The dashboard groups notes by the first word of their risk level
+# ('CRITICAL (Red)' → 'CRITICAL'); notes saved without triage are UNTRIAGED.
+RISK_BUCKETS = ("CRITICAL", "URGENT", "ROUTINE", "UNTRIAGED")
+
+def risk_bucket(level):
+    words = (level or "").split()
+    return words[0].upper() if words else "UNTRIAGED"
+
+# The same in SQL: tabs and newlines count as spaces, leading ones are skipped
+_RISK_WORDS_SQL = "ltrim(replace(replace(replace(risk_level, char(9), ' '), char(10), ' '), char(13), ' '))"
+_RISK_BUCKET_SQL = (f"COALESCE(NULLIF(upper(substr({_RISK_WORDS_SQL}, 1, instr({_RISK_WORDS_SQL} || ' ', ' ') - 1)), ''), "
+                    "'UNTRIAGED')")
+
+# Day/bucket counts computed from the summaries table itself
+_DAILY_COUNTS_SQL = (f"SELECT date(created_at, 'unixepoch', 'localtime') AS day, {_RISK_BUCKET_SQL} AS bucket, "
+                     f"COUNT(*) FROM summaries GROUP BY day, bucket")
+
+# --- SCHEMA MIGRATIONS ---
+# Applied in order; PRAGMA user_version records how many have run, so an
+# existing medical_summaries.db upgrades in place the next time init_db()
+# runs. Only ever append to this list.
+MIGRATIONS = [
+    # 1. Original schema (databases created before migrations sit at version 0)
+    [
+        """CREATE TABLE IF NOT EXISTS summaries (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             original_text TEXT,
             generated_summary TEXT,
             created_at TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
+        )""",
+    ],
+    # 2. created_at as integer Unix seconds instead of 'YYYY-MM-DD HH:MM:SS' local-time text
+    [
+        """CREATE TABLE summaries_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            original_text TEXT,
+            generated_summary TEXT,
+            created_at INTEGER NOT NULL
+        )""",
+        """INSERT INTO summaries_new (id, original_text, generated_summary, created_at)
+           SELECT id, original_text, generated_summary,
+                  COALESCE(CAST(strftime('%s', created_at, 'utc') AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))
+           FROM summaries""",
+        "DROP TABLE summaries",
+        "ALTER TABLE summaries_new RENAME TO summaries",
+    ],
+    # 3. Newest-first history and date-range stats without a full sort
+    [
+        "CREATE INDEX IF NOT EXISTS idx_summaries_created_at ON summaries (created_at)",
+    ],
+    # 4. Triage result and a hash of the note for de-duplication
+    [
+        "ALTER TABLE summaries ADD COLUMN risk_level TEXT",
+        "ALTER TABLE summaries ADD COLUMN risk_score INTEGER",
+        "ALTER TABLE summaries ADD COLUMN content_hash TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_summaries_content_hash ON summaries (content_hash)",
+    ],
+    # 5. Per-day, per-risk-bucket counts for the dashboard, kept up to date by save_summary
+    [
+        """CREATE TABLE daily_counts (
+            day TEXT NOT NULL,
+            risk_bucket TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, risk_bucket)
+        ) WITHOUT ROWID""",
+        f"INSERT INTO daily_counts (day, risk_bucket, count) {_DAILY_COUNTS_SQL}",
+    ],
+    # 6. Full-text index over notes and summaries, and original_text
+    #    compressed (see note_compression) with each note's uncompressed size
+    #    kept. The index is contentless and fed by db_manager when it writes
+    #    (see _insert_records), so the schema has no triggers or application
+    #    functions and any SQLite client can read and write the file. It is
+    #    filled from the plain text before compressing.
+    [
+        """CREATE VIRTUAL TABLE summaries_fts USING fts5(
+            original_text, generated_summary,
+            content='',
+            tokenize='porter unicode61'
+        )""",
+        """INSERT INTO summaries_fts (rowid, original_text, generated_summary)
+           SELECT id, original_text, generated_summary FROM summaries""",
+        "ALTER TABLE summaries ADD COLUMN original_bytes INTEGER",
+        """UPDATE summaries SET original_bytes = length(CAST(original_text AS BLOB)),
+                                original_text = compress_text(original_text)
+           WHERE typeof(original_text) = 'text'""",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def _register_functions(conn):
+    # For one-off statements over stored note text (migrations, index
+    # rebuilds) only; the schema itself never calls them
+    conn.create_function('compress_text', 1, compress_text, deterministic=True)
+    conn.create_function('decompress_text', 1, decompress_text, deterministic=True)
 
-def save_summary(text, summary):
+def migrate(conn):
+    """Apply pending migrations on `conn`. Returns the (old, new) schema version."""
+    _register_functions(conn)
+    # IMMEDIATE takes the write lock up front, so two processes starting
+    # together can't both run the same migration
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        current = conn.execute('PRAGMA user_version').fetchone()[0]
+        for version in range(current + 1, SCHEMA_VERSION + 1):
+            for statement in MIGRATIONS[version - 1]:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version}')
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return current, max(current, SCHEMA_VERSION)
+
+def init_db():
     """
-    Saves a new record into the database.
+    Creates the database, or upgrades an existing one to the current schema.
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    c.execute('INSERT INTO summaries (original_text, generated_summary, created_at) VALUES (?, ?, ?)',
-              (text, summary, current_time))
-    
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        migrate(conn)
+
+def _content_hash(text):
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+def _bump_daily_counts(conn, counts):
+    """Add {(day, bucket): n} to the rollup, on the caller's transaction."""
+    conn.executemany(
+        'INSERT INTO daily_counts (day, risk_bucket, count) VALUES (?, ?, ?) '
+        'ON CONFLICT (day, risk_bucket) DO UPDATE SET count = count + excluded.count',
+        [(day, bucket, n) for (day, bucket), n in counts.items()]
+    )
+
+# Records written per executemany in save_summaries_bulk
+BULK_BATCH_ROWS = 1000
+
+def _insert_records(conn, records):
+    """
+    Insert (text, summary, created_at, risk) tuples on the caller's
+    transaction: the note is compressed here, and the plain text goes to
+    the search index in the same transaction.
+    """
+    conn.executemany(
+        'INSERT INTO summaries (original_text, generated_summary, created_at, risk_level, risk_score, '
+        '                       content_hash, original_bytes) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [(compress_text(text), summary, created_at, risk.get('level'), risk.get('score'), _content_hash(text),
+          len(text.encode('utf-8')) if text is not None else None)
+         for text, summary, created_at, risk in records]
+    )
+    # We hold the write lock, so the batch got consecutive ids ending at the last one
+    last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+    first_id = last_id - len(records) + 1
+    conn.executemany(
+        'INSERT INTO summaries_fts (rowid, original_text, generated_summary) VALUES (?, ?, ?)',
+        [(first_id + i, text, summary) for i, (text, summary, _, _) in enumerate(records)]
+    )
+
+def save_summary(text, summary, risk=None):
+    """
+    Saves a new record into the database. `risk` is the dict from
+    ai_engine.calculate_risk_score, if the note was triaged.
+    """
+    risk = risk or {}
+    created_at = int(time.time())
+    with connection() as conn:
+        _insert_records(conn, [(text, summary, created_at, risk)])
+        # Same transaction: the rollup can never disagree with the table
+        day = time.strftime('%Y-%m-%d', time.localtime(created_at))
+        _bump_daily_counts(conn, {(day, risk_bucket(risk.get('level'))): 1})
+
+def save_summaries_bulk(records):
+    """
+    Saves many records in one transaction with a single executemany.
+    Each record is a dict with 'text', 'summary' and optionally 'risk'
+    (as for save_summary) and 'created_at' (Unix seconds, default now).
+    `records` may be a generator; it is consumed lazily. Returns the number
+    of rows written.
+    """
+    now = int(time.time())
+    counts = {}
+    batch = []
+    with connection() as conn:
+        for record in records:
+            risk = record.get('risk') or {}
+            created_at = int(record.get('created_at') or now)
+            key = (time.strftime('%Y-%m-%d', time.localtime(created_at)), risk_bucket(risk.get('level')))
+            counts[key] = counts.get(key, 0) + 1
+            batch.append((record.get('text'), record.get('summary'), created_at, risk))
+            if len(batch) >= BULK_BATCH_ROWS:
+                _insert_records(conn, batch)
+                batch = []
+        if batch:
+            _insert_records(conn, batch)
+        _bump_daily_counts(conn, counts)
+    return sum(counts.values())
 
 def get_all_summaries():
     """
     Retrieves all records from the database to show history.
+    Rows are (id, original_text, generated_summary, created_at) with
+    created_at as local 'YYYY-MM-DD HH:MM:SS', newest first.
+    """
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT id, original_text, generated_summary, "
+            "       strftime('%Y-%m-%d %H:%M:%S', created_at, 'unixepoch', 'localtime') "
+            "FROM summaries ORDER BY created_at DESC, id DESC"
+        ).fetchall()
+    return [(row_id, decompress_text(text), summary, created_at) for row_id, text, summary, created_at in rows]
+
+def get_original_text(summary_id):
+    """Full note text of one record (decompressed only here, on request), or None."""
+    with connection() as conn:
+        row = conn.execute('SELECT original_text FROM summaries WHERE id = ?', (summary_id,)).fetchone()
+    return decompress_text(row[0]) if row else None
+
+def _encode_cursor(created_at, row_id):
+    return f"{created_at}:{row_id}"
+
+def _decode_cursor(cursor):
+    created_at, row_id = cursor.split(':')
+    return int(created_at), int(row_id)
+
+def get_history_page(limit=5, cursor=None, preview_chars=80):
+    """
+    One page of history, newest first, without loading note text.
+    Returns (rows, next_cursor): rows are (id, created_at, summary_preview)
+    with created_at as local 'YYYY-MM-DD HH:MM', and the preview cut to
+    `preview_chars` (plus '...' when longer). Pass next_cursor back in to
+    get the following page; it is None on the last page.
+    """
+    sql = ("SELECT id, created_at, substr(generated_summary, 1, ?) FROM summaries "
+           "{where} ORDER BY created_at DESC, id DESC LIMIT ?")
+    # One extra character tells us whether the preview was truncated
+    params = [preview_chars + 1]
+    if cursor:
+        sql = sql.format(where="WHERE (created_at, id) < (?, ?)")
+        params += list(_decode_cursor(cursor))
+    else:
+        sql = sql.format(where="")
+    params.append(limit + 1)  # one extra row tells us whether there is a next page
+
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    page = [
+        (row_id,
+         time.strftime('%Y-%m-%d %H:%M', time.localtime(created_at)),
+         (summary[:preview_chars] + "...") if summary and len(summary) > preview_chars else (summary or ''))
+        for row_id, created_at, summary in rows
+    ]
+    next_cursor = _encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+    return page, next_cursor
+
+# --- FULL-TEXT SEARCH ---
+_FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def _fts_query(text):
+    """
+    Free text → FTS5 query: every word must match (implicit AND), the last
+    one as a prefix so results update while typing. Quoting each word keeps
+    user input from being parsed as FTS5 syntax.
+    """
+    words = _FTS_TOKEN.findall(text or '')
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def _snippet(text, words, highlight, tokens):
+    """
+    The `tokens`-word window of `text` with the most query-word hits, hits
+    wrapped in `highlight` and '…' where the text was cut, plus the hit count.
+    A word matches a query word it starts with (plurals, the typed prefix).
+    """
+    spans = [(m.start(), m.end(), m.group().lower().startswith(words)) for m in _FTS_TOKEN.finditer(text or '')]
+    if not spans:
+        return '', 0
+    hits = [hit for _, _, hit in spans]
+    best, best_hits = 0, sum(hits[:tokens])
+    window_hits = best_hits
+    for first in range(1, len(spans) - tokens + 1):
+        window_hits += hits[first + tokens - 1] - hits[first - 1]
+        if window_hits > best_hits:
+            best, best_hits = first, window_hits
+    window = spans[best:best + tokens]
+    parts, position = [], window[0][0]
+    for start, end, hit in window:
+        if hit:
+            parts += [text[position:start], highlight[0], text[start:end], highlight[1]]
+            position = end
+    parts.append(text[position:window[-1][1]])
+    prefix = '…' if best > 0 else ''
+    suffix = '…' if best + tokens < len(spans) else ''
+    return prefix + ''.join(parts) + suffix, best_hits
+
+def search_summaries(query, limit=20, offset=0, highlight=('<mark>', '</mark>'), snippet_tokens=16):
+    """
+    Ranked full-text search over note text and summaries. Returns rows of
+    (id, created_at, risk_level, snippet), best match first, with
+    created_at as local 'YYYY-MM-DD HH:MM' and the matched words in the
+    snippet wrapped in `highlight`. The snippet text is not HTML-escaped.
+    """
+    match = _fts_query(query)
+    if match is None:
+        return []
+    # The index is contentless, so snippets are cut here from the (few) matching rows
+    sql = (
+        "SELECT s.id, s.created_at, s.risk_level, s.original_text, s.generated_summary "
+        "FROM summaries_fts JOIN summaries AS s ON s.id = summaries_fts.rowid "
+        "WHERE summaries_fts MATCH ? "
+        "ORDER BY summaries_fts.rank LIMIT ? OFFSET ?"
+    )
+    with connection() as conn:
+        rows = conn.execute(sql, (match, limit, offset)).fetchall()
+    words = tuple(word.lower() for word in _FTS_TOKEN.findall(query))
+    results = []
+    for row_id, created_at, risk_level, text, summary in rows:
+        # Like FTS5's snippet(): the column with the best window, the note on a tie
+        candidates = [_snippet(decompress_text(text), words, highlight, snippet_tokens),
+                      _snippet(summary, words, highlight, snippet_tokens)]
+        snippet = max(candidates, key=lambda candidate: candidate[1])[0]
+        results.append((row_id, time.strftime('%Y-%m-%d %H:%M', time.localtime(created_at)), risk_level, snippet))
+    return results
+
+def rebuild_search_index():
+    """
+    Re-index every record for search (e.g. after rows were written by
+    another tool, which doesn't feed the index). Returns the rows indexed.
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('SELECT * FROM summaries ORDER BY created_at DESC')
-    data = c.fetchall()
-    conn.close()
-    return data
+    with connection() as conn:
+        _register_functions(conn)
+        conn.execute("INSERT INTO summaries_fts (summaries_fts) VALUES ('delete-all')")
+        conn.execute("INSERT INTO summaries_fts (rowid, original_text, generated_summary) "
+                     "SELECT id, decompress_text(original_text), generated_summary FROM summaries")
+        return conn.execute('SELECT COUNT(*) FROM summaries').fetchone()[0]
 
-def get_entity_stats():
+def _day(value):
+    # Accept 'YYYY-MM-DD' strings or date/datetime objects
+    return value if isinstance(value, str) or value is None else value.strftime('%Y-%m-%d')
+
+def get_entity_stats(start=None, end=None, by_risk=False):
+    """
+    Analyzes patient traffic for the dashboard, read from the daily_counts
+    rollup (a few rows per day, whatever the table size). `start` and `end`
+    ('YYYY-MM-DD' or dates, inclusive) limit the range. Returns
+    {'YYYY-MM-DD': count}, or with by_risk=True
+    {'YYYY-MM-DD': {'CRITICAL': n, 'URGENT': n, ...}}.
+    """
+    sql = "SELECT day, risk_bucket, count FROM daily_counts WHERE day >= ? AND day <= ? ORDER BY day"
+    with connection() as conn:
+        rows = conn.execute(sql, (_day(start) or '0000-00-00', _day(end) or '9999-99-99')).fetchall()
+
+    stats = {}
+    for day, bucket, count in rows:
+        if by_risk:
+            stats.setdefault(day, {})[bucket] = count
+        else:
+            stats[day] = stats.get(day, 0) + count
+    return stats
+
+def rebuild_daily_counts():
+    """
+    Recompute the daily_counts rollup from the summaries table with one
+    GROUP BY (e.g. after rows were inserted without going through
+    save_summary). Returns the number of rollup rows.
+    """
+    with connection() as conn:
+        conn.execute('DELETE FROM daily_counts')
+        conn.execute(f"INSERT INTO daily_counts (day, risk_bucket, count) {_DAILY_COUNTS_SQL}")
+        return conn.execute('SELECT COUNT(*) FROM daily_counts').fetchone()[0]
+
+# --- RECORD EXPORT ---
+def _local_epoch(day, days_after=0):
+    """Unix seconds of local midnight on `day` ('YYYY-MM-DD' or a date), plus `days_after` days."""
+    parsed = time.strptime(_day(day), '%Y-%m-%d')
+    return int(time.mktime((parsed.tm_year, parsed.tm_mon, parsed.tm_mday + days_after, 0, 0, 0, 0, 0, -1)))
+
+def _record_filter(ids=None, start=None, end=None, risk_buckets=None):
+    """WHERE clauses and parameters shared by count_summaries and iter_summaries."""
+    clauses, params = [], []
+    if ids is not None:
+        ids = [int(i) for i in ids]
+        clauses.append(f"id IN ({', '.join('?' * len(ids))})" if ids else "0")
+        params += ids
+    if start:
+        clauses.append("created_at >= ?")
+        params.append(_local_epoch(start))
+    if end:
+        clauses.append("created_at < ?")
+        params.append(_local_epoch(end, days_after=1))
+    if risk_buckets:
+        clauses.append(f"{_RISK_BUCKET_SQL} IN ({', '.join('?' * len(risk_buckets))})")
+        params += list(risk_buckets)
+    return clauses, params
+
+def count_summaries(ids=None, start=None, end=None, risk_buckets=None):
     """
-    Analyzes patient traffic for the dashboard.
+    Number of records matching the iter_summaries filters. Without `ids`
+    this is read from the daily_counts rollup, not the table.
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('SELECT created_at FROM summaries')
-    data = c.fetchall()
-    conn.close()
+    if ids is None:
+        sql = "SELECT COALESCE(SUM(count), 0) FROM daily_counts WHERE day >= ? AND day <= ?"
+        params = [_day(start) or '0000-00-00', _day(end) or '9999-99-99']
+        if risk_buckets:
+            sql += f" AND risk_bucket IN ({', '.join('?' * len(risk_buckets))})"
+            params += list(risk_buckets)
+        with connection() as conn:
+            return conn.execute(sql, params).fetchone()[0]
 
-    # Extract just the date part (YYYY-MM-DD)
-    dates = [row[0].split(" ")[0] for row in data]
-    return dict(Counter(dates))
+    clauses, params = _record_filter(ids, start, end, risk_buckets)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM summaries {where}", params).fetchone()[0]
+
+def iter_summaries(ids=None, start=None, end=None, risk_buckets=None, chunk_size=100, include_text=False):
+    """
+    Yield records oldest first as dicts with id, created_at (local
+    'YYYY-MM-DD HH:MM'), risk_level, risk_score and summary. Filters: `ids`,
+    an inclusive `start`/`end` date range and `risk_buckets` (see
+    RISK_BUCKETS). Rows are read `chunk_size` at a time, each chunk on a
+    briefly borrowed connection, so memory stays flat for any number of
+    records. Note text is only read (and decompressed) with `include_text`,
+    as 'text'.
+    """
+    clauses, params = _record_filter(ids, start, end, risk_buckets)
+    text_column = "original_text" if include_text else "NULL"
+    sql = (f"SELECT id, created_at, risk_level, risk_score, generated_summary, {text_column} FROM summaries "
+           f"WHERE {' AND '.join(clauses + ['id > ?'])} ORDER BY id LIMIT ?")
+    last_id = 0
+    while True:
+        with connection() as conn:
+            rows = conn.execute(sql, params + [last_id, chunk_size]).fetchall()
+        for row_id, created_at, risk_level, risk_score, summary, text in rows:
+            record = {
+                'id':         row_id,
+                'created_at': time.strftime('%Y-%m-%d %H:%M', time.localtime(created_at)),
+                'risk_level': risk_level,
+                'risk_score': risk_score,
+                'summary':    summary or '',
+            }
+            if include_text:
+                record['text'] = decompress_text(text) or ''
+            yield record
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+def compression_report():
+    """
+    Space used by note text: rows, how many are compressed, bytes stored vs
+    bytes uncompressed, and the database file's size and free pages (space
+    freed by compression is reused by SQLite, or returned to the OS by
+    vacuum()).
+    """
+    with connection() as conn:
+        rows, compressed, stored, original = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(typeof(original_text) = 'blob'), 0), "
+            "       COALESCE(SUM(length(CAST(original_text AS BLOB))), 0), "
+            # Rows written by other tools have no original_bytes; they can only hold plain text
+            "       COALESCE(SUM(COALESCE(original_bytes, length(CAST(original_text AS BLOB)))), 0) "
+            "FROM summaries"
+        ).fetchone()
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        pages = conn.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return {
+        'rows':            rows,
+        'compressed_rows': compressed,
+        'original_bytes':  original,
+        'stored_bytes':    stored,
+        'saved_bytes':     original - stored,
+        'ratio':           round(original / stored, 2) if stored else 0.0,
+        'file_bytes':      page_size * pages,
+        'free_bytes':      page_size * free_pages,
+    }
+
+def vacuum():
+    """Rewrite the database file to return free pages to the OS."""
+    conn = get_pool()._connect()
+    try:
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
 
 # Initialize on import
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create or upgrade the summaries database.")
+    parser.add_argument("--report", action="store_true", help="Show how much space note compression saves")
+    parser.add_argument("--vacuum", action="store_true", help="Compact the file after upgrading")
+    args = parser.parse_args()
+
     init_db()
-    print("Database initialized.")
\ No newline at end of file
+    print("Database initialized.")
+    if args.vacuum:
+        vacuum()
+        print("Database vacuumed.")
+    if args.report:
+        report = compression_report()
+        mb = 1024 * 1024
+        print(f"{report['compressed_rows']} of {report['rows']} notes compressed: "
+              f"{report['original_bytes'] / mb:.1f} MB → {report['stored_bytes'] / mb:.1f} MB "
+              f"({report['ratio']}x, {report['saved_bytes'] / mb:.1f} MB saved)")
+        print(f"file: {report['file_bytes'] / mb:.1f} MB, of which {report['free_bytes'] / mb:.1f} MB free")
@@ -0,0 +1,369 @@
+"""
+Page-parallel text extraction for uploaded PDFs and images.
+
+Each PDF page uses its text layer when it has one. Pages without one (scans)
+are rasterized and OCR'd with Tesseract, spread across a process pool, and
+pages are handed back in page order as soon as they are ready, so callers
+can show and analyze the first pages while later ones are still in OCR. Every page records how it was read
+and how long it took, so slow documents can be explained page by page.
+
+Before Tesseract, images are normalized to OCR_DPI, converted to grayscale
+and binarized (see preprocess_for_ocr). OCR'd pages are cached by a hash of
+the image bytes, so a re-uploaded scan skips OCR entirely.
+
+pdfplumber, Pillow and pytesseract are imported inside the functions that
+use them; importing this module is cheap. ai_engine takes load_tesseract
+from here.
+"""
+from collections import deque, namedtuple
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import functools
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from result_cache import ResultCache
+
+# Resolution Tesseract sees (its sweet spot): scanned PDF pages are
+# rasterized at it and images are resampled to it. Photos without DPI
+# metadata are assumed to be a letter-size page and sized to match, as are
+# images whose DPI tag would make them larger than any paper page (phone
+# cameras write 72 DPI, which puts a 12 MP photo at 56 inches).
+OCR_RESOLUTION = 300
+PAGE_HEIGHT_INCHES = 11
+MAX_PAGE_INCHES = 17
+
+
+def _usable_cpus():
+    """CPUs this process may run on (os.cpu_count() is the host's, even in a container)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Windows, macOS
+        return os.cpu_count() or 1
+
+
+# Cap on OCR worker processes. Each one imports pdfplumber and Pillow, so the
+# default is one per usable CPU but never more than DEFAULT_OCR_WORKERS.
+DEFAULT_OCR_WORKERS = 4
+MAX_OCR_WORKERS = int(os.environ.get("CLINICAL_NLP_OCR_WORKERS", "0")) or min(_usable_cpus(), DEFAULT_OCR_WORKERS)
+
+# Bump when preprocessing or Tesseract settings change; part of the cache key
+OCR_VERSION = f"2|{OCR_RESOLUTION}dpi|otsu"
+
+# One extracted page. method is 'text' (text layer), 'ocr', 'cache' (OCR text
+# from the page cache), 'empty' or 'error' (OCR failed).
+PageResult = namedtuple('PageResult', 'index text method seconds')
+
+ocr_cache = ResultCache("ocr_pages")
+
+
+@functools.lru_cache(maxsize=None)
+def load_tesseract():
+    import pytesseract
+    # Check if running on local Windows machine or Cloud Linux using os.name
+    if os.name == 'nt':  # 'nt' is the internal code for Windows
+        # Update this path if your local Tesseract is installed elsewhere
+        pytesseract.pytesseract.tesseract_cmd = r'D:\DevData\Tessarat\tesseract.exe'
+    return pytesseract
+
+
+def _otsu_threshold(histogram):
+    """Grey level that best separates ink from paper in a 256-bin histogram."""
+    total = sum(histogram)
+    sum_all = sum(i * h for i, h in enumerate(histogram))
+    sum_bg = weight_bg = 0
+    best, threshold = -1.0, 127
+    for level, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += level * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, level
+    return threshold
+
+
+def preprocess_for_ocr(image, dpi=OCR_RESOLUTION, binarize=True):
+    """
+    Prepare a PIL image for Tesseract: apply EXIF rotation, resample to `dpi`
+    (downscaling 12 MP phone photos, upscaling low-resolution faxes), convert
+    to grayscale and, with binarize=True, threshold to black and white.
+    """
+    from PIL import Image, ImageOps
+
+    dpi_info = image.info.get('dpi')
+    # Grayscale first: resampling one channel is a third of the work of RGB
+    image = ImageOps.exif_transpose(image).convert('L')
+    source_dpi = (dpi_info or (0, 0))[0]
+    long_side = max(image.size)
+    if source_dpi and source_dpi > 1 and long_side / source_dpi <= MAX_PAGE_INCHES:
+        scale = dpi / source_dpi
+    else:
+        # No usable DPI tag (typical for phone photos): size the long side as a letter page
+        scale = dpi * PAGE_HEIGHT_INCHES / long_side
+    if abs(scale - 1) > 0.05:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS if scale < 1 else Image.BICUBIC)
+
+    gray = ImageOps.autocontrast(image)
+    if not binarize:
+        return gray
+    threshold = _otsu_threshold(gray.histogram())
+    return gray.point(lambda v: 255 if v > threshold else 0, mode='1')
+
+
+def ocr_image(image, preprocess=True):
+    """Run Tesseract on a PIL image, preprocessed first unless preprocess=False."""
+    if preprocess:
+        image = preprocess_for_ocr(image)
+    return load_tesseract().image_to_string(image)
+
+
+def _cache_key(digest, index):
+    return f"{OCR_VERSION}|{digest}|{index}"
+
+
+def _cached_page(key, index):
+    started = time.perf_counter()
+    cached = ocr_cache.get(key)
+    if cached is None:
+        return None
+    return PageResult(index, cached['text'], 'cache', round(time.perf_counter() - started, 3))
+
+
+# ── OCR worker processes ────────────────────────────────────────────────────
+# One pool per process, shared by every extraction and started with
+# forkserver/spawn: forking would copy the whole caller (under Streamlit, the
+# server with its loaded models and open SQLite connections). A document is
+# handed to the workers as a temporary file; each worker keeps the last PDF
+# it opened and rasterizes whichever pages it is given.
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+_worker_pdf = None  # (path, pdfplumber PDF) in a worker process
+
+
+def _pool_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _shared_pool(workers):
+    """The process-wide OCR pool with at least `workers` processes, or None where processes aren't available."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            try:
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+                _pool_workers = workers
+            except (OSError, RuntimeError, ValueError):
+                _pool, _pool_workers = None, 0  # no process support here (sandbox, frozen app) — OCR in-process
+        return _pool
+
+
+def _discard_pool(pool):
+    """
+    Forget a broken pool so the next extraction starts a fresh one. Other
+    extractions may still be waiting on it, so their futures are left alone.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is pool:
+            _pool, _pool_workers = None, 0
+    pool.shutdown(wait=False)
+
+
+def _ocr_pdf_page(pdf, index, resolution=OCR_RESOLUTION):
+    started = time.perf_counter()
+    try:
+        image = pdf.pages[index].to_image(resolution=resolution).original
+        image.info['dpi'] = (resolution, resolution)
+        text = ocr_image(image)
+        method = 'ocr' if text.strip() else 'empty'
+    except Exception:
+        # One unreadable scan (or no Tesseract install) shouldn't lose the other pages
+        text, method = '', 'error'
+    return PageResult(index, text, method, round(time.perf_counter() - started, 3))
+
+
+def _worker_ocr_page(path, index):
+    global _worker_pdf
+    if _worker_pdf is None or _worker_pdf[0] != path:
+        import pdfplumber
+        if _worker_pdf is not None:
+            _worker_pdf[1].close()
+        _worker_pdf = (path, pdfplumber.open(path))
+    return _ocr_pdf_page(_worker_pdf[1], index)
+
+
+# ── PDF / image extraction ──────────────────────────────────────────────────
+def _read_bytes(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    if hasattr(source, 'read'):
+        return source.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def _resolve(pdf, pool, item):
+    """Turn a queued page (a PageResult, or an index with its pending OCR future) into a PageResult."""
+    if isinstance(item, PageResult):
+        return item
+    index, future = item
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+    except (CancelledError, OSError, RuntimeError):
+        pass  # cancelled with a shut-down pool, or the worker couldn't open the file: OCR it here
+    return _ocr_pdf_page(pdf, index)
+
+
+def page_count(source, file_type):
+    """Number of pages extraction will yield for this document."""
+    if "pdf" in file_type:
+        import pdfplumber
+        with pdfplumber.open(io.BytesIO(_read_bytes(source))) as pdf:
+            return len(pdf.pages)
+    return 1 if "image" in file_type else 0
+
+
+def _remember_ocr(page, digest, use_cache):
+    # Cache what Tesseract produced; text-layer pages are cheap and failures may be transient
+    if use_cache and page.method in ('ocr', 'empty'):
+        ocr_cache.put(_cache_key(digest, page.index), {'text': page.text}, version=OCR_VERSION)
+    return page
+
+
+def iter_pdf_pages(source, workers=None, ocr=True, first_page=0, use_cache=True):
+    """
+    Yield a PageResult for each page of a PDF (path, bytes or file-like), in
+    page order, as soon as it and every page before it are done. Pages with a
+    text layer are read directly; the rest come from the OCR page cache or are
+    OCR'd across `workers` processes (default MAX_OCR_WORKERS) unless
+    ocr=False. `first_page` resumes an interrupted extraction.
+    """
+    import pdfplumber
+
+    pdf_bytes = _read_bytes(source)
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        pages = pdf.pages[first_page:]
+        workers = min(workers or MAX_OCR_WORKERS, len(pages))
+        pool = pdf_path = None
+        queue = deque()
+        try:
+            for index, page in enumerate(pages, start=first_page):
+                started = time.perf_counter()
+                text = page.extract_text() or ''
+                if text.strip():
+                    queue.append(PageResult(index, text, 'text', round(time.perf_counter() - started, 3)))
+                elif not ocr:
+                    queue.append(PageResult(index, '', 'empty', round(time.perf_counter() - started, 3)))
+                elif use_cache and (cached := _cached_page(_cache_key(digest, index), index)):
+                    queue.append(cached)
+                else:
+                    if pool is None and workers > 1:
+                        pool = _shared_pool(workers)
+                        workers = workers if pool else 1
+                        if pool is not None:
+                            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+                                f.write(pdf_bytes)
+                            pdf_path = f.name
+                    future = None
+                    if pool is not None:
+                        try:
+                            future = pool.submit(_worker_ocr_page, pdf_path, index)
+                        except RuntimeError:  # broken or shut down since the last page
+                            _discard_pool(pool)
+                            pool, workers = None, 1
+                    queue.append((index, future) if future else _ocr_pdf_page(pdf, index))
+
+                # Hand back every finished page at the head of the queue
+                while queue and (isinstance(queue[0], PageResult) or queue[0][1].done()):
+                    yield _remember_ocr(_resolve(pdf, pool, queue.popleft()), digest, use_cache)
+
+            while queue:
+                yield _remember_ocr(_resolve(pdf, pool, queue.popleft()), digest, use_cache)
+        finally:
+            # The pool stays up for the next document; drop this one's pending pages
+            for item in queue:
+                if not isinstance(item, PageResult):
+                    item[1].cancel()
+            if pdf_path is not None:
+                try:
+                    os.remove(pdf_path)
+                except OSError:
+                    pass
+
+
+def extract_pdf_pages(source, workers=None, ocr=True, use_cache=True):
+    """All pages of a PDF at once (see iter_pdf_pages). Returns PageResults in page order."""
+    return list(iter_pdf_pages(source, workers=workers, ocr=ocr, use_cache=use_cache))
+
+
+def extract_image_pages(source, use_cache=True):
+    """OCR an uploaded image. Returns a single-element list of PageResult."""
+    from PIL import Image
+
+    data = _read_bytes(source)
+    key = _cache_key(hashlib.sha256(data).hexdigest(), 0)
+    if use_cache and (cached := _cached_page(key, 0)):
+        return [cached]
+
+    started = time.perf_counter()
+    text = ocr_image(Image.open(io.BytesIO(data)))
+    if use_cache:
+        ocr_cache.put(key, {'text': text}, version=OCR_VERSION)
+    return [PageResult(0, text, 'ocr' if text.strip() else 'empty', round(time.perf_counter() - started, 3))]
+
+
+def join_pages(pages):
+    """Document text from page results: each non-empty page followed by a newline."""
+    return ''.join(page.text + "\n" for page in pages if page.text)
+
+
+def document_text(pages, file_type):
+    """Text of a (possibly partial) extraction: an image's OCR text as-is, PDF pages joined."""
+    if "image" in file_type:
+        return pages[0].text if pages else ''
+    return join_pages(pages)
+
+
+def iter_document_pages(source, file_type, workers=None, first_page=0):
+    """
+    Yield PageResults for an uploaded document as they become available.
+    `file_type` is its MIME type; images yield a single page.
+    """
+    if "image" in file_type:
+        if first_page == 0:
+            yield from extract_image_pages(source)
+    elif "pdf" in file_type:
+        yield from iter_pdf_pages(source, workers=workers, first_page=first_page)
+
+
+def extract_document(source, file_type, workers=None):
+    """
+    Extract an uploaded document. `file_type` is its MIME type. Returns
+    {'text', 'pages', 'seconds'} where pages holds one PageResult per page.
+    """
+    started = time.perf_counter()
+    pages = list(iter_document_pages(source, file_type, workers=workers))
+    return {'text': document_text(pages, file_type), 'pages': pages, 'seconds': round(time.perf_counter() - started, 3)}
@@ -0,0 +1,185 @@
+"""
+Process-wide registry for the heavy NLP models.
+
+Models are registered by name with a factory and loaded on first use. The
+registry tracks the resident memory of each loaded model and, when a new
+load would exceed the memory budget, evicts the least-recently-used models
+first. It is a plain module-level object, so it works the same under
+Streamlit (one registry per server process, shared by all sessions) and in
+headless batch jobs.
+"""
+from collections import OrderedDict
+import gc
+import os
+import threading
+import time
+
+# Memory budget for all loaded models together, in MB. Leave headroom under
+# the container limit for Python, Streamlit and the request itself. Read from
+# BUDGET_ENV when a registry is created without an explicit budget.
+DEFAULT_BUDGET_MB = 3072
+BUDGET_ENV = "CLINICAL_NLP_MODEL_BUDGET_MB"
+
+MB = 1024 * 1024
+
+
+def _rss_bytes():
+    """Current resident set size of this process (Linux), or 0 if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _model_bytes(model, rss_delta):
+    """
+    Memory held by a loaded model. For transformers pipelines this is the
+    size of the weights and buffers; for anything else, the growth in
+    process RSS measured while it loaded.
+    """
+    torch_model = getattr(model, "model", None)
+    if torch_model is not None and hasattr(torch_model, "parameters"):
+        tensors = list(torch_model.parameters()) + list(torch_model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    return max(rss_delta, 0)
+
+
+class ModelRegistry:
+    """
+    Loads models by name, keeps them resident in LRU order and evicts the
+    least recently used ones to stay within `budget_mb` (default: the
+    BUDGET_ENV environment variable, else DEFAULT_BUDGET_MB).
+
+    The registry lock only guards its bookkeeping. Each model has its own
+    load lock, so a slow load blocks callers of that model only; models
+    already loaded stay available to everyone.
+    """
+
+    def __init__(self, budget_mb=None):
+        if budget_mb is None:
+            budget_mb = int(os.environ.get(BUDGET_ENV, DEFAULT_BUDGET_MB))
+        self.budget_bytes = int(budget_mb * MB)
+        self._factories = {}
+        self._loaded = OrderedDict()  # name → {'model', 'bytes', 'load_seconds', 'last_used'}
+        self._known_bytes = {}        # name → size from its last load, used to evict ahead of a reload
+        self._load_locks = {}         # name → lock held while that model loads
+        self._lock = threading.RLock()
+
+    def register(self, name, factory):
+        """Register a zero-argument `factory` that builds the model called `name`."""
+        with self._lock:
+            self._factories[name] = factory
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """Return the model called `name`, loading it (and evicting others) if needed."""
+        model = self._touch(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Unknown model '{name}'. Registered: {', '.join(self._factories)}")
+            load_lock = self._load_locks[name]
+        with load_lock:
+            # Another caller may have finished loading it while we waited
+            model = self._touch(name)
+            if model is None:
+                model = self._load(name)
+            return model
+
+    def _touch(self, name):
+        """The model called `name` if loaded, marked most recently used; else None."""
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is None:
+                return None
+            self._loaded.move_to_end(name)
+            entry['last_used'] = time.time()
+            return entry['model']
+
+    def _load(self, name):
+        """Build `name` (caller holds its load lock) and add it, evicting to stay within budget."""
+        with self._lock:
+            # Make room first when we already know how big this model is
+            self._evict_until(self.budget_bytes - self._known_bytes.get(name, 0))
+            factory = self._factories[name]
+
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        model = factory()
+        load_seconds = time.perf_counter() - started
+        size = _model_bytes(model, _rss_bytes() - rss_before)
+
+        with self._lock:
+            self._known_bytes[name] = size
+            self._loaded[name] = {
+                'model': model,
+                'bytes': size,
+                'load_seconds': round(load_seconds, 3),
+                'last_used': time.time(),
+            }
+            self._evict_until(self.budget_bytes, keep=name)
+        return model
+
+    def _evict_until(self, limit_bytes, keep=None):
+        """Drop least-recently-used models until resident memory <= limit_bytes."""
+        for name in list(self._loaded):
+            if self.memory_bytes() <= limit_bytes:
+                break
+            if name != keep:
+                self.unload(name)
+
+    def unload(self, name):
+        """Drop a loaded model so its memory can be reclaimed. Returns True if it was loaded."""
+        with self._lock:
+            entry = self._loaded.pop(name, None)
+        if entry is None:
+            return False
+        del entry
+        gc.collect()
+        return True
+
+    def preload(self, names):
+        """Load several models up front. Returns the seconds each load took."""
+        timings = {}
+        for name in names:
+            started = time.perf_counter()
+            self.get(name)
+            timings[name] = round(time.perf_counter() - started, 3)
+        return timings
+
+    def set_budget(self, budget_mb):
+        """Change the memory budget, evicting right away if now over it."""
+        with self._lock:
+            self.budget_bytes = int(budget_mb * MB)
+            self._evict_until(self.budget_bytes)
+
+    def memory_bytes(self):
+        """Resident memory of all loaded models together."""
+        with self._lock:
+            return sum(entry['bytes'] for entry in self._loaded.values())
+
+    def loaded(self):
+        """Loaded models, least recently used first, with their memory in MB."""
+        with self._lock:
+            return [
+                {
+                    'name':         name,
+                    'memory_mb':    round(entry['bytes'] / MB, 1),
+                    'load_seconds': entry['load_seconds'],
+                    'last_used':    entry['last_used'],
+                }
+                for name, entry in self._loaded.items()
+            ]
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._loaded
+
+    def registered(self):
+        return list(self._factories)
+
+
+# Shared registry for this process
+registry = ModelRegistry()
@@ -0,0 +1,78 @@
+"""
+Compression for stored note text.
+
+Notes are deflated with zlib using a preset dictionary of common clinical
+phrasing, which helps most on short notes, where plain zlib has no history
+to draw on. Compressed values are bytes that start with a format byte;
+anything else (str, None) is stored and returned as-is, so compressed and
+uncompressed rows can share a column.
+
+The dictionary is part of the storage format: never edit NOTE_DICTIONARY_V1.
+To change it, add a new dictionary under a new format byte and keep the old
+one for decoding.
+"""
+import zlib
+
+# Phrases are ordered roughly least to most common: deflate reaches the end
+# of the dictionary with the shortest back-references.
+NOTE_DICTIONARY_V1 = " ".join([
+    "Differential diagnosis includes", "Follow up in clinic in two weeks.", "Return precautions discussed.",
+    "Discharge Summary", "Referral Letter", "Dear Colleague,", "Thank you for seeing this patient.",
+    "Laboratory Results:", "Hemoglobin", "white cell count", "platelets", "creatinine", "troponin", "sodium",
+    "potassium", "glucose", "HbA1c", "cholesterol", "LDL", "eGFR", "INR", "CRP", "BNP", "D-dimer",
+    "Chest X-ray", "CT scan", "MRI", "ultrasound", "echocardiogram", "ECG shows", "sinus rhythm",
+    "ST elevation", "ST depression", "T wave inversion", "atrial fibrillation", "ejection fraction",
+    "appendectomy", "cholecystectomy", "hysterectomy", "CABG", "PCI with stent", "knee replacement",
+    "Allergies: NKDA", "No known drug allergies.", "penicillin allergy",
+    "aspirin 81 mg daily", "clopidogrel 75 mg daily", "atorvastatin 40 mg nightly", "metoprolol 25 mg BID",
+    "lisinopril 10 mg daily", "amlodipine 5 mg daily", "metformin 500 mg BID", "insulin glargine",
+    "furosemide 20 mg daily", "warfarin", "apixaban", "omeprazole 20 mg daily", "levothyroxine",
+    "salbutamol inhaler", "paracetamol", "ibuprofen", "nitroglycerin", "prednisone",
+    "hypertension", "hyperlipidemia", "type 2 diabetes mellitus", "coronary artery disease", "asthma",
+    "COPD", "chronic kidney disease", "heart failure", "hypothyroidism", "GERD", "anemia", "stroke",
+    "myocardial infarction", "pneumonia", "sepsis", "urinary tract infection",
+    "Soft systolic murmur", "bibasilar crackles", "wheezing", "pedal edema", "JVP not elevated",
+    "Abdomen soft, non-tender, non-distended.", "Heart sounds S1 S2 normal.", "Lungs clear to auscultation.",
+    "alert and oriented", "in no acute distress", "well-appearing",
+    "Denies fever, chills, nausea, vomiting.", "denies shortness of breath", "no chest pain",
+    "Non-smoker.", "Smoker, pack years.", "Denies alcohol.", "Drinks socially.", "lives with",
+    "Father had a heart attack", "Mother with diabetes.", "Family history of",
+    "radiates to the left arm", "on exertion", "relieved by rest", "associated with", "diaphoresis",
+    "shortness of breath", "palpitations", "dizziness", "headache", "abdominal pain", "chest pain",
+    "fever", "cough", "nausea", "vomiting", "fatigue", "weakness",
+    "BP: mmHg Pulse: bpm Temp: RR: SpO2: % on room air",
+    "Blood Pressure", "Heart Rate", "Respiratory Rate", "Temperature", "Oxygen Saturation",
+    "Plan: labs, ECG, follow up in clinic.", "Assessment and Plan:", "Assessment:", "Plan:",
+    "Physical Examination:", "Vital Signs:", "Medications:", "Social History:", "Family History:",
+    "Past Surgical History:", "Past Medical History:", "History of Present Illness:",
+    "Chief Complaint:", "Patient Name:", "Date of Birth:", "Age:", "Sex:", "MRN:",
+    "diagnosed years ago", "since", "history of", "the patient", "patient reports", "The patient is a",
+    "-year-old male with a", "-year-old female with a", "-day history of", " with ", " and ", " the ",
+    " of ", " to ", " in ", " for ", " is ", " was ", " no ", " on ", ".\n", ", ",
+]).encode("utf-8")
+
+_FORMAT_ZLIB_V1 = b"\x01"
+
+# Shorter notes are stored as text: the format byte and deflate framing eat the gain
+MIN_COMPRESS_CHARS = 64
+
+
+def compress_text(text):
+    """Compress note text for storage. Returns bytes, or `text` unchanged when short or not a str."""
+    if not isinstance(text, str) or len(text) < MIN_COMPRESS_CHARS:
+        return text
+    raw = text.encode("utf-8")
+    compressor = zlib.compressobj(level=6, wbits=-15, zdict=NOTE_DICTIONARY_V1)
+    packed = _FORMAT_ZLIB_V1 + compressor.compress(raw) + compressor.flush()
+    return packed if len(packed) < len(raw) else text
+
+
+def decompress_text(value):
+    """Inverse of compress_text: bytes from compress_text → str; anything else is returned as-is."""
+    if not isinstance(value, (bytes, bytearray)):
+        return value
+    if value[:1] == _FORMAT_ZLIB_V1:
+        decompressor = zlib.decompressobj(wbits=-15, zdict=NOTE_DICTIONARY_V1)
+        return (decompressor.decompress(value[1:]) + decompressor.flush()).decode("utf-8")
+    # Not ours (e.g. a BLOB written by another tool): hand back the bytes
+    return bytes(value)
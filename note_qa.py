@@ -0,0 +1,268 @@
+"""
+Extractive question answering over whole notes.
+
+A note is tokenized once with the QA model's tokenizer and cut into
+overlapping passages of PASSAGE_TOKENS tokens; the passages and a BM25 index
+over their words are cached per note (NoteIndex). For each question, BM25
+picks the top-k passages and only those are run through the QA model, from
+the cached token ids; several questions about one note share a single
+batch (answer_many). Answers carry character offsets into
+the full note, so nothing past the first page is cut off.
+
+torch and numpy are imported inside the functions that use them; importing
+this module is cheap.
+"""
+from collections import Counter, OrderedDict
+import math
+import re
+import threading
+
+from result_cache import content_hash
+
+# Passage length and step, in model tokens: consecutive passages overlap by
+# PASSAGE_TOKENS - PASSAGE_STRIDE tokens so an answer is never split in two
+PASSAGE_TOKENS = 256
+PASSAGE_STRIDE = 192
+
+# Longer questions are truncated; keeps question + passage within the model limit
+QUESTION_MAX_TOKENS = 64
+
+# Longest answer span considered, in tokens (the question-answering pipeline's default)
+MAX_ANSWER_TOKENS = 15
+
+# Best spans kept per (question, passage) pair; spans that cover the same
+# words add up, as in the pipeline (which keeps 12 for a single answer)
+SPAN_CANDIDATES = 12
+
+TOP_K_PASSAGES = 3
+
+# (question, passage) pairs per model forward pass
+QA_BATCH_SIZE = 32
+
+# BM25 parameters (the usual Okapi defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Notes whose index is kept in memory
+INDEX_CACHE_SIZE = 16
+
+_TERM = re.compile(r"[a-z0-9]+")
+
+# Question words that say nothing about where the answer is
+_STOPWORDS = frozenset("""
+a an and are as at be by did do does for from had has have he her his how in is it of on or she
+the their they this to was were what when where which who whom why with patient patients
+""".split())
+
+
+def terms(text):
+    """Lowercased BM25 terms of `text`, stopwords dropped."""
+    return [term for term in _TERM.findall(text.lower()) if term not in _STOPWORDS]
+
+
+class NoteIndex:
+    """
+    A note split into passages for retrieval and QA. Built once per note
+    and tokenizer (see note_index); holds the note's token ids and character
+    offsets, each passage's token range and the BM25 statistics.
+    """
+
+    def __init__(self, text, tokenizer):
+        self.text = text
+        encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        self.input_ids = encoding['input_ids']
+        self.offsets = encoding['offset_mapping']
+
+        # (first token, end token) of each passage
+        self.passages = []
+        for start in range(0, max(len(self.input_ids), 1), PASSAGE_STRIDE):
+            end = min(start + PASSAGE_TOKENS, len(self.input_ids))
+            self.passages.append((start, end))
+            if end == len(self.input_ids):
+                break
+
+        self.term_counts = [Counter(terms(self.passage_text(i))) for i in range(len(self.passages))]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) or 1.0
+        document_frequency = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        count = len(self.passages)
+        self.idf = {
+            term: math.log((count - df + 0.5) / (df + 0.5) + 1)
+            for term, df in document_frequency.items()
+        }
+
+    def passage_span(self, index):
+        """Character (start, end) of passage `index` in the note."""
+        start, end = self.passages[index]
+        if start == end:
+            return 0, 0
+        return self.offsets[start][0], self.offsets[end - 1][1]
+
+    def passage_text(self, index):
+        start, end = self.passage_span(index)
+        return self.text[start:end]
+
+    def bm25(self, query_terms):
+        """BM25 score of every passage for `query_terms`."""
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self.average_length)
+            score = 0.0
+            for term in query_terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def top_passages(self, question, k=TOP_K_PASSAGES):
+        """Indices of the `k` best passages for `question`; ties (and no overlap at all) go to earlier passages."""
+        scores = self.bm25(terms(question))
+        return sorted(range(len(scores)), key=lambda i: (-scores[i], i))[:k]
+
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def note_index(text, tokenizer):
+    """The NoteIndex for `text`, from the in-memory cache or built and cached."""
+    key = content_hash(text, getattr(tokenizer, 'name_or_path', type(tokenizer).__name__))
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    index = NoteIndex(text, tokenizer)
+    with _index_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def _top_spans(start_logits, end_logits, context, cls_positions, count=SPAN_CANDIDATES):
+    """
+    The `count` most likely answer spans in `context` (a slice of the input
+    positions), best first, as (start, end, score) with end inclusive and
+    positions relative to the context. Scored as the QA pipeline does:
+    probabilities are normalized over the context and the CLS token, whose
+    share is the no-answer mass, so a passage without a good answer scores
+    low.
+    """
+    import numpy as np
+
+    def probabilities(logits):
+        kept = np.concatenate([logits[cls_positions], logits[context]])
+        shift = kept.max()
+        return np.exp(logits[context] - shift) / np.exp(kept - shift).sum()
+
+    # Spans with start <= end < start + MAX_ANSWER_TOKENS
+    candidates = np.triu(np.tril(np.outer(probabilities(start_logits), probabilities(end_logits)),
+                                 MAX_ANSWER_TOKENS - 1))
+    scores = candidates.ravel()
+    best = np.argsort(-scores, kind='stable')[:count]
+    starts, ends = np.unravel_index(best, candidates.shape)
+    return [(int(start), int(end), float(scores[flat]))
+            for start, end, flat in zip(starts, ends, best) if start <= end]
+
+
+def _run_model(qa_pipeline, pairs):
+    """
+    Score (question ids, passage ids) pairs in one forward pass. Returns,
+    per pair, its best spans (see _top_spans) with token positions relative
+    to the passage.
+    """
+    import torch
+
+    tokenizer, model = qa_pipeline.tokenizer, qa_pipeline.model
+    features, context_starts, cls_positions = [], [], []
+    for question_ids, passage_ids in pairs:
+        input_ids = tokenizer.build_inputs_with_special_tokens(question_ids, passage_ids)
+        special = tokenizer.get_special_tokens_mask(input_ids, already_has_special_tokens=True)
+        # The passage is the last run of ordinary tokens
+        context_starts.append([i for i, flag in enumerate(special) if not flag][len(question_ids)])
+        # The pipeline leaves CLS unmasked, so it takes part in normalizing the scores
+        cls_positions.append([i for i, token in enumerate(input_ids)
+                              if tokenizer.cls_token_id is not None and token == tokenizer.cls_token_id])
+        feature = {'input_ids': input_ids}
+        if 'token_type_ids' in tokenizer.model_input_names:
+            feature['token_type_ids'] = tokenizer.create_token_type_ids_from_sequences(question_ids, passage_ids)
+        features.append(feature)
+
+    # Right-pad to the longest pair
+    width = max(len(feature['input_ids']) for feature in features)
+    batch = {'attention_mask': torch.tensor([[1] * len(f['input_ids']) + [0] * (width - len(f['input_ids']))
+                                             for f in features])}
+    for name, pad in (('input_ids', tokenizer.pad_token_id), ('token_type_ids', 0)):
+        if name in features[0]:
+            batch[name] = torch.tensor([f[name] + [pad] * (width - len(f[name])) for f in features])
+    with torch.no_grad():
+        output = model(**batch)
+    start_logits = output.start_logits.numpy()
+    end_logits = output.end_logits.numpy()
+
+    spans = []
+    for row, ((_, passage_ids), offset, cls) in enumerate(zip(pairs, context_starts, cls_positions)):
+        context = slice(offset, offset + len(passage_ids))
+        spans.append(_top_spans(start_logits[row], end_logits[row], context, cls))
+    return spans
+
+
+def answer_many(qa_pipeline, text, questions, top_k=TOP_K_PASSAGES, batch_size=QA_BATCH_SIZE):
+    """
+    Answer every question in `questions` from the whole of `text`. The note
+    is tokenized once (see note_index) and the questions in one call; BM25
+    picks each question's `top_k` passages and all (question, passage)
+    pairs go through the QA model together, `batch_size` pairs per forward
+    pass. Returns, in question order, dicts with 'question', 'answer',
+    'score', 'start' and 'end' (character offsets into `text`) for the best
+    span across that question's passages.
+    """
+    questions = list(questions)
+    if not questions:
+        return []
+    tokenizer = qa_pipeline.tokenizer
+    index = note_index(text, tokenizer)
+    if not index.input_ids:
+        return [{'question': q, 'answer': '', 'score': 0.0, 'start': 0, 'end': 0} for q in questions]
+
+    question_ids = [ids[:QUESTION_MAX_TOKENS]
+                    for ids in tokenizer(questions, add_special_tokens=False)['input_ids']]
+    jobs = [(number, passage) for number, question in enumerate(questions)
+            for passage in index.top_passages(question, top_k)]
+    pairs = [(question_ids[number], index.input_ids[slice(*index.passages[passage])]) for number, passage in jobs]
+    spans = []
+    for first in range(0, len(pairs), batch_size):
+        spans += _run_model(qa_pipeline, pairs[first:first + batch_size])
+
+    # Per question, {answer text: [score, start, end]}: as in the pipeline,
+    # spans (from any passage) that widen to the same words add their scores
+    found = [{} for _ in questions]
+    for (number, passage), candidates in zip(jobs, spans):
+        passage_start = index.passages[passage][0]
+        for first, last, score in candidates:
+            start, end = index.offsets[passage_start + first][0], index.offsets[passage_start + last][1]
+            # Widen to whole words, as the pipeline does: subword tokens can start or end mid-word
+            while 0 < start < end and text[start].isalnum() and text[start - 1].isalnum():
+                start -= 1
+            while start < end < len(text) and text[end - 1].isalnum() and text[end].isalnum():
+                end += 1
+            entry = found[number].setdefault(text[start:end].lower(), [0.0, start, end])
+            entry[0] += score
+
+    answers = []
+    for question, candidates in zip(questions, found):
+        score, start, end = max(candidates.values(), key=lambda entry: entry[0])
+        answers.append({'question': question, 'answer': text[start:end], 'score': score, 'start': start, 'end': end})
+    return answers
+
+
+def answer(qa_pipeline, text, question, top_k=TOP_K_PASSAGES):
+    """
+    Answer one question from the whole of `text` (see answer_many). Returns
+    a dict with 'answer', 'score', 'start' and 'end'.
+    """
+    return answer_many(qa_pipeline, text, [question], top_k)[0]
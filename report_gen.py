@@ -1,28 +1,58 @@
-from fpdf import FPDF
+import argparse
+import codecs
+import itertools
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import re
+import sys
+import time
+
+from fpdf import FPDF, FPDF_VERSION
+
+try:
+    import resource  # Unix only; used for peak-memory reporting
+except ImportError:
+    resource = None
+
+# Characters the PDF core fonts (latin-1 only) can't show, replaced during
+# the latin-1 encode: the emoji ai_engine puts in risk actions become text labels,
+# typographic punctuation becomes its ASCII look-alike and invisible emoji
+# modifiers are dropped. Anything else outside latin-1 becomes '?'.
+PDF_REPLACEMENTS = {
+    "🚨": "[CRITICAL] ",
+    "⚠": "[URGENT] ",      # '⚠️' is ⚠ + U+FE0F, dropped below
+    "✅": "[OK] ",
+    "💊": "",
+    "🔬": "",
+    "📈": "",
+    "\ufe0f": "",          # emoji presentation selector
+    "\u200d": "",          # zero-width joiner
+    "—": "-", "–": "-", "‘": "'", "’": "'", "“": '"', "”": '"',
+    "…": "...", "→": "->", "•": "-", "≥": ">=", "≤": "<=",
+}
+
+def _pdf_replace_errors(error):
+    """Codec error handler: swap each run of non-latin-1 characters for its PDF_REPLACEMENTS text."""
+    run = error.object[error.start:error.end]
+    return ''.join([PDF_REPLACEMENTS.get(char, '?') for char in run]), error.end
+
+codecs.register_error('pdf_replace', _pdf_replace_errors)
 
 def clean_text(text):
     """
-    1. Replaces emojis with text labels (PDF doesn't support emojis).
-    2. Fixes encoding errors.
+    Make text safe for the PDF core fonts in one pass: emoji become text
+    labels and characters outside latin-1 are replaced (see PDF_REPLACEMENTS).
     """
     if not text:
         return ""
-    
-    # Manual Emoji Replacements
-    replacements = {
-        "🚨": "[CRITICAL] ",
-        "⚠️": "[URGENT] ",
-        "✅": "[OK] ",
-        "💊": "",
-        "🔬": "",
-        "📈": ""
-    }
-    
-    for emoji, replacement in replacements.items():
-        text = text.replace(emoji, replacement)
-        
-    # Final encoding safety net
-    return text.encode('latin-1', 'replace').decode('latin-1')
+    if text.isascii():
+        return text  # nothing to replace — the common case
+    # The latin-1 codec scans in C and calls back into Python only for the
+    # characters it can't encode, which are exactly the ones to replace
+    return text.encode('latin-1', 'pdf_replace').decode('latin-1')
 
 class PDFReport(FPDF):
     def header(self):
@@ -39,8 +69,16 @@ class PDFReport(FPDF):
         self.set_font('Arial', 'I', 8)
         self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
 
-def create_pdf(summary, risk_data, entities):
-    pdf = PDFReport()
+def _entity_lines(entities):
+    """One '- word (GROUP)' line per reportable entity."""
+    return "".join([
+        f"- {ent['word']} ({ent['entity_group']})\n"
+        for ent in entities
+        if len(ent['word']) > 2 and "##" not in ent['word']
+    ])
+
+def _render(pdf, summary, risk_data, entities):
+    """Lay out the three report sections on a fresh PDFReport."""
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
     
@@ -69,14 +107,235 @@ def create_pdf(summary, risk_data, entities):
     pdf.set_font('Arial', '', 10)
     
     pdf.multi_cell(0, 8, "The following entities were extracted and verified:")
-    
-    # Simple extraction for report
-    extracted_text = ""
-    for ent in entities:
-        if len(ent['word']) > 2 and "##" not in ent['word']:
-             extracted_text += f"- {ent['word']} ({ent['entity_group']})\n"
-    
-    pdf.multi_cell(0, 8, clean_text(extracted_text))
+    pdf.multi_cell(0, 8, clean_text(_entity_lines(entities)))
+
+def _pdf_bytes(pdf):
+    return pdf.output(dest='S').encode('latin-1', 'replace')
+
+def create_pdf(summary, risk_data, entities):
+    pdf = PDFReport()
+    _render(pdf, summary, risk_data, entities)
     
     # Return as binary string
-    return pdf.output(dest='S').encode('latin-1', 'replace')
\ No newline at end of file
+    return _pdf_bytes(pdf)
+
+# --- WRITING TO FILES ---
+# write_pdf and write_packet lean on fpdf 1.7 internals (its output buffer,
+# and for packets revisiting earlier pages for the table of contents);
+# requirements.txt pins it
+
+class _PDFBuffer:
+    """
+    Stand-in for fpdf 1.7's output string: FPDF appends with `buffer += line`,
+    which copies the whole document every time (quadratic over thousands of
+    pages). This keeps the lines in a list and only tracks the length FPDF
+    reads for its object offsets.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.length = 0
+
+    def __iadd__(self, text):
+        self.chunks.append(text)
+        self.length += len(text)
+        return self
+
+    def __len__(self):
+        return self.length
+
+class StreamedReport(PDFReport):
+    """A PDFReport whose output is kept in chunks and written out by _write_out."""
+    def __init__(self):
+        if not FPDF_VERSION.startswith('1.7.'):
+            raise RuntimeError(f"Streamed reports need fpdf 1.7.x (see requirements.txt), found {FPDF_VERSION}")
+        super().__init__()
+        self.buffer = _PDFBuffer()
+
+def _write_out(pdf, dest):
+    """Finish a StreamedReport and write it to `dest`, a file path or a binary stream, chunk by chunk."""
+    pdf.close()
+    stream = dest if hasattr(dest, 'write') else open(dest, 'wb')
+    try:
+        for chunk in pdf.buffer.chunks:
+            stream.write(chunk.encode('latin-1', 'replace'))
+    finally:
+        if stream is not dest:
+            stream.close()
+
+def write_pdf(summary, risk_data, entities, dest):
+    """
+    Write one report to `dest`, a file path or a binary stream, without
+    building the whole file in memory first. Returns the number of pages.
+    """
+    pdf = StreamedReport()
+    _render(pdf, summary, risk_data, entities)
+    _write_out(pdf, dest)
+    return pdf.page
+
+# --- WARD PACKETS ---
+TOC_ROWS_PER_PAGE = 30
+
+def _toc_heading(pdf, title, continued):
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, clean_text(title), 0, 1)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 10, 'TABLE OF CONTENTS' + (' (continued)' if continued else ''), 0, 1)
+    pdf.set_font('Arial', '', 10)
+
+def _render_record(pdf, record):
+    """One packet section: a fresh page with the record's risk and summary. Returns its first page."""
+    pdf.add_page()
+    first_page = pdf.page
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 10, f"Record #{record['id']} - {record['created_at']}", 0, 1)
+    pdf.set_font('Arial', '', 11)
+    level = record.get('risk_level') or 'Not triaged'
+    score = record.get('risk_score')
+    if score is not None:
+        level += f" (score {score})"
+    pdf.cell(0, 10, clean_text(f"Risk Level: {level}"), 0, 1)
+    pdf.ln(2)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 10, 'CLINICAL SUMMARY', 0, 1)
+    pdf.set_font('Arial', '', 11)
+    pdf.multi_cell(0, 8, clean_text(record['summary']))
+    return first_page
+
+def _render_toc(pdf, title, entries, first_page):
+    """Fill the reserved table-of-contents pages, TOC_ROWS_PER_PAGE linked rows per page."""
+    pdf.set_auto_page_break(False)
+    for start in range(0, max(len(entries), 1), TOC_ROWS_PER_PAGE):
+        pdf.page = first_page + start // TOC_ROWS_PER_PAGE
+        pdf.set_xy(pdf.l_margin, 35)
+        _toc_heading(pdf, title, continued=start > 0)
+        for record, page, link in entries[start:start + TOC_ROWS_PER_PAGE]:
+            label = clean_text(f"#{record['id']}   {record['created_at']}   {record.get('risk_level') or 'Not triaged'}")
+            pdf.cell(160, 7, label, 0, 0, '', False, link)
+            pdf.cell(0, 7, str(page), 0, 1, 'R', False, link)
+
+def write_packet(records, dest, total, title="Ward Round Packet"):
+    """
+    Write one PDF covering many records — a table of contents, then one
+    section per record — to `dest`, a file path or a binary stream. Records
+    are dicts as yielded by db_manager.iter_summaries and may be a
+    generator; `total` (e.g. db_manager.count_summaries) sizes the table of
+    contents, which is reserved up front and filled in once every section's
+    page is known, and caps how many records are read. Records are laid
+    out as they are read and not kept; fpdf does hold the laid-out pages (a
+    few KB each) until the file is written, so write to a file rather than
+    collecting the bytes. Returns the number of pages.
+    """
+    pdf = StreamedReport()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    for _ in range(max(1, math.ceil(total / TOC_ROWS_PER_PAGE))):
+        pdf.add_page()
+
+    # Only (record header, page, link) is kept per section: summaries are
+    # dropped as soon as they are laid out
+    entries = []
+    for record in itertools.islice(records, total):
+        page = _render_record(pdf, record)
+        link = pdf.add_link()
+        pdf.set_link(link, 0, page)
+        entries.append(({'id': record['id'], 'created_at': record['created_at'],
+                         'risk_level': record.get('risk_level')}, page, link))
+
+    last_page = pdf.page
+    _render_toc(pdf, title, entries, first_page=1)
+    # Back to the last page so close() puts the final footer in the right place
+    pdf.page = last_page
+    _write_out(pdf, dest)
+    return last_page
+
+# --- BATCH REPORTS ---
+# Reports in flight per worker; bounds memory when `records` is a long stream
+BATCH_QUEUE_PER_WORKER = 4
+
+def report_file_name(record_id):
+    """Safe '<id>.pdf' file name for a record id."""
+    return re.sub(r'[^\w.-]', '_', str(record_id)) + ".pdf"
+
+def _write_record(record, out_dir):
+    path = os.path.join(out_dir, report_file_name(record['id']))
+    pages = write_pdf(record['summary'], record['risk'], record['entities'], path)
+    return record['id'], path, pages
+
+def write_reports(records, out_dir, workers=None):
+    """
+    Write one PDF per record into `out_dir` as <id>.pdf. Records are dicts
+    with 'id', 'summary', 'risk' and 'entities' — the output of
+    `python -m ai_engine batch` — and may be a generator. Reports are
+    rendered across `workers` processes (default: one per CPU), with only a
+    few in flight per worker. Yields (id, path, pages) in input order.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for record in records:
+            yield _write_record(record, out_dir)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for record in records:
+            pending.append(pool.submit(_write_record, record, out_dir))
+            if len(pending) >= workers * BATCH_QUEUE_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _peak_memory_mb():
+    """Peak RSS of this process and of its largest finished worker, in MB (None where unsupported)."""
+    if resource is None:
+        return None, None
+    # ru_maxrss is KB on Linux, bytes on macOS
+    unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / (1024 * 1024)
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / (1024 * 1024)
+    return round(own, 1), round(workers, 1)
+
+def _read_results(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def run_report_batch(input_path, out_dir, workers=None, progress_every=500):
+    """
+    Write a PDF for every result in a .jsonl file (from `python -m ai_engine
+    batch`). Reports reports/sec, pages/sec and peak memory on stderr and
+    returns them as a dict.
+    """
+    started = time.perf_counter()
+    reports = pages = 0
+    for _, _, page_count in write_reports(_read_results(input_path), out_dir, workers=workers):
+        reports += 1
+        pages += page_count
+        if progress_every and reports % progress_every == 0:
+            elapsed = time.perf_counter() - started
+            print(f"{reports} reports · {pages / elapsed:.1f} pages/sec", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    own_mb, worker_mb = _peak_memory_mb()
+    stats = {
+        'reports':          reports,
+        'pages':            pages,
+        'seconds':          round(elapsed, 3),
+        'pages_per_second': round(pages / elapsed, 2) if elapsed > 0 else 0.0,
+        'peak_rss_mb':      own_mb,
+        'peak_worker_rss_mb': worker_mb,
+    }
+    print(f"Done: {reports} reports, {pages} pages in {elapsed:.1f}s "
+          f"({stats['pages_per_second']:.1f} pages/sec)", file=sys.stderr)
+    if own_mb is not None:
+        print(f"Peak memory: {own_mb:.0f} MB main process, {worker_mb:.0f} MB largest worker", file=sys.stderr)
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write PDF reports for a .jsonl file of analysis results.")
+    parser.add_argument("--input", required=True, help="Results .jsonl from 'python -m ai_engine batch'")
+    parser.add_argument("--out-dir", required=True, help="Folder for the <id>.pdf reports")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--progress-every", type=int, default=500, help="Report throughput every N reports (0 = off)")
+    args = parser.parse_args()
+    run_report_batch(args.input, args.out_dir, workers=args.workers, progress_every=args.progress_every)
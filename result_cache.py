@@ -0,0 +1,137 @@
+"""
+Two-tier cache for analysis results.
+
+Values are JSON-serialisable dicts stored under a namespace and a key. Reads
+go to an in-memory LRU first, then to a SQLite file that lives next to
+medical_summaries.db and survives restarts. Every entry records the version
+string it was computed under, so entries made with older rules or models can
+be purged in one call.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Persistent tier — same directory as db_manager.DB_NAME
+CACHE_DB_NAME = "analysis_cache.db"
+
+
+def content_hash(*parts):
+    """Stable SHA-256 hex digest of the given strings."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    In-memory LRU in front of a persistent SQLite table.
+
+    Both tiers hold values as JSON and every get() decodes a fresh copy, so
+    callers may modify what they get without touching the cache.
+
+    get() and put() are thread-safe. stats() reports hits per tier, misses
+    and the overall hit rate since the process started.
+    """
+
+    def __init__(self, namespace, max_memory_items=256, db_path=CACHE_DB_NAME):
+        self.namespace = namespace
+        self.max_memory_items = max_memory_items
+        self.db_path = db_path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            ''')
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key, encoded):
+        self._memory[key] = encoded
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached value for `key`, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(self._memory[key])
+
+            row = self._db().execute(
+                'SELECT value FROM cache WHERE namespace = ? AND key = ?', (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._remember(key, row[0])
+            self.disk_hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, value, version=""):
+        """Store `value` in both tiers, tagged with the `version` it was computed under."""
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, encoded)
+            db = self._db()
+            db.execute(
+                'INSERT OR REPLACE INTO cache (namespace, key, version, value, created_at) VALUES (?, ?, ?, ?, ?)',
+                (self.namespace, key, version, encoded, int(time.time()))
+            )
+            db.commit()
+
+    def invalidate(self, keep_versions=None):
+        """
+        Delete cached entries. With `keep_versions`, only entries computed
+        under other versions are removed (e.g. after a rule table change).
+        Returns the number of persistent rows deleted.
+        """
+        with self._lock:
+            # Memory entries carry no version — drop them all, the disk tier refills it
+            self._memory.clear()
+            db = self._db()
+            if keep_versions is None:
+                cur = db.execute('DELETE FROM cache WHERE namespace = ?', (self.namespace,))
+            else:
+                keep_versions = list(keep_versions)
+                placeholders = ', '.join('?' * len(keep_versions))
+                cur = db.execute(
+                    f'DELETE FROM cache WHERE namespace = ? AND version NOT IN ({placeholders})',
+                    [self.namespace] + keep_versions
+                )
+            db.commit()
+            return cur.rowcount
+
+    def stats(self):
+        """Hit/miss counters since start-up."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits':  self.memory_hits,
+                'disk_hits':    self.disk_hits,
+                'misses':       self.misses,
+                'hit_rate':     round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                'memory_items': len(self._memory),
+            }
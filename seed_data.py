@@ -1,31 +1,142 @@
-import sqlite3
+import argparse
 from datetime import datetime, timedelta
+import itertools
 import random
+import time
 
-DB_NAME = "medical_summaries.db"
+import db_manager
+
+# Building blocks for synthetic clinical notes
+FIRST_NAMES = ["John", "Mary", "Ahmed", "Priya", "Carlos", "Mei", "Olga", "James", "Fatima", "Liam"]
+LAST_NAMES = ["Smith", "Patel", "Garcia", "Chen", "Okafor", "Ivanova", "Brown", "Khan", "Nguyen", "Murphy"]
+COMPLAINTS = ["chest pain", "shortness of breath", "abdominal pain", "headache", "fever and cough", "dizziness", "palpitations"]
+CHARACTERS = ["dull", "sharp", "burning", "pressure-like", "throbbing"]
+ASSOCIATED = ["nausea", "diaphoresis", "vomiting", "dizziness", "orthopnea", "palpitations", "sweating"]
+CONDITIONS = ["hypertension", "type 2 diabetes", "asthma", "COPD", "atrial fibrillation", "hyperlipidemia",
+              "GERD", "anemia", "hypothyroidism", "chronic kidney disease", "peptic ulcer disease"]
+SURGERIES = ["appendectomy", "cholecystectomy", "hysterectomy", "bunionectomy"]
+FAMILY = ["Father had a heart attack at 55.", "Mother with diabetes.", "Family history of hypertension.",
+          "Family history of cancer.", "Brother with premature CAD."]
+MEDICATIONS = ["aspirin 81 mg daily", "metoprolol 25 mg BID", "lisinopril 10 mg daily", "atorvastatin 40 mg nightly",
+               "metformin 500 mg BID", "amlodipine 5 mg daily", "furosemide 20 mg daily"]
+EXAM = ["Soft systolic murmur at the apex.", "Bibasilar crackles.", "Mild expiratory wheezing.",
+        "Trace bilateral pedal edema.", "JVP not elevated.", "S4 gallop.", "Abdomen soft, non-tender."]
+ASSESSMENTS = ["Unstable angina", "Community-acquired pneumonia", "Hypertensive urgency", "GERD exacerbation",
+               "Acute decompensated heart failure", "Migraine without aura", "Viral gastroenteritis"]
+
+
+def synthetic_case(rng=random):
+    """
+    Build one realistic-looking, fully synthetic clinical note with the
+    sections the summarizer understands (HPI, PMH, family/social history,
+    medications, vitals, exam and a numbered assessment). Returns
+    (note, hpi), where hpi is the note's opening HPI sentence ("The patient
+    is a 54-year-old male with ...").
+    """
+    age = rng.randint(18, 92)
+    sex = rng.choice(["male", "female"])
+    complaint = rng.choice(COMPLAINTS)
+    days = rng.randint(1, 14)
+    name = f"Patient Name: {rng.choice(LAST_NAMES)}, {rng.choice(FIRST_NAMES)}"
+    hpi = (f"The patient is a {age}-year-old {sex} with a {days}-day history of {rng.choice(CHARACTERS)} {complaint}"
+           f"{' on exertion' if rng.random() < 0.5 else ''}{', radiates to the left arm' if rng.random() < 0.3 else ''}.")
+    lines = [
+        name,
+        f"Chief Complaint: {complaint} for {days} days",
+        "History of Present Illness:",
+        hpi,
+        f"Reports {', '.join(rng.sample(ASSOCIATED, rng.randint(1, 3)))}. "
+        f"{'Relieved by rest.' if rng.random() < 0.5 else 'No relief with rest.'}",
+        "Past Medical History:",
+    ]
+    for condition in rng.sample(CONDITIONS, rng.randint(1, 4)):
+        when = rng.choice([f"diagnosed {rng.randint(1, 20)} years ago", f"since {rng.randint(1985, 2023)}", ""])
+        lines.append(f"{condition} {when}".strip() + ".")
+    lines.append(f"Past Surgical - {rng.choice(SURGERIES)} {rng.randint(1980, 2023)}.")
+    lines += ["Family History:", " ".join(rng.sample(FAMILY, rng.randint(1, 2)))]
+    lines += ["Social History:",
+              rng.choice(["Non-smoker.", f"Smoker, {rng.randint(5, 40)} pack years."]) + " "
+              + rng.choice(["Denies alcohol.", "Drinks wine socially."])]
+    lines += ["Medications:", ", ".join(rng.sample(MEDICATIONS, rng.randint(1, 4)))]
+    lines += ["Vital Signs:",
+              f"BP: {rng.randint(95, 190)}/{rng.randint(55, 110)} Pulse: {rng.randint(48, 130)} "
+              f"Temp: {rng.uniform(36.0, 39.8):.1f} RR: {rng.randint(12, 28)} SpO2: {rng.randint(86, 100)}%"]
+    lines += ["Physical Examination:", " ".join(rng.sample(EXAM, rng.randint(1, 3)))]
+    lines.append("Assessment:")
+    for i, item in enumerate(rng.sample(ASSESSMENTS, rng.randint(1, 3)), start=1):
+        lines.append(f"{i}. {item}")
+    lines.append("Plan: labs, ECG, follow up in clinic.")
+    return "\n".join(lines), hpi
+
+def synthetic_note(rng=random):
+    """Text of one synthetic clinical note (see synthetic_case)."""
+    return synthetic_case(rng)[0]
+
+def history_records(days, patients_per_day, rng=random, analyze=False):
+    """
+    Yield save_summaries_bulk() records for the last `days` days, about
+    `patients_per_day` patients a day (±50%) at random times of day. Each
+    record holds a synthetic note with its real risk triage. Summaries are
+    the note's HPI sentence, or the full summarizer output with analyze=True
+    (much slower; use it when summary length matters to the benchmark).
+    """
+    import ai_engine
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for day in range(days):
+        midnight = int((today - timedelta(days=day)).timestamp())
+        low, high = max(1, patients_per_day // 2), max(1, patients_per_day * 3 // 2)
+        for _ in range(rng.randint(low, high)):
+            text, hpi = synthetic_case(rng)
+            summary = ai_engine.summarize_medical_text(text) if analyze else hpi
+            yield {
+                'text':       text,
+                'summary':    summary,
+                'risk':       ai_engine.calculate_risk_score(text),
+                'created_at': midnight + rng.randint(0, 86399),
+            }
+
+def seed_history(days, patients_per_day, rng=random, analyze=False, chunk_size=50000, progress=True):
+    """
+    Write `days` × ~`patients_per_day` synthetic records with
+    db_manager.save_summaries_bulk, one transaction per `chunk_size` rows.
+    Returns the number of rows written.
+    """
+    db_manager.init_db()
+    records = history_records(days, patients_per_day, rng=rng, analyze=analyze)
+    started = time.perf_counter()
+    total = 0
+    while True:
+        written = db_manager.save_summaries_bulk(itertools.islice(records, chunk_size))
+        if not written:
+            break
+        total += written
+        if progress:
+            rate = total / (time.perf_counter() - started)
+            print(f"{total} rows · {rate:.0f} rows/sec")
+    return total
 
 def add_fake_history():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
     print("Injecting fake history...")
-    
-    # We will add data for the last 5 days
-    for i in range(5):
-        # Calculate a date in the past (e.g., 1 day ago, 2 days ago)
-        date_in_past = datetime.now() - timedelta(days=i)
-        date_str = date_in_past.strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Randomly decide how many patients to add for that day (between 2 and 8)
-        num_patients = random.randint(2, 8)
-        
-        for _ in range(num_patients):
-            c.execute('INSERT INTO summaries (original_text, generated_summary, created_at) VALUES (?, ?, ?)',
-                      ("Fake medical note for testing graph.", "Fake summary.", date_str))
-            
-    conn.commit()
-    conn.close()
+    # About 5 patients a day for the last 5 days
+    seed_history(days=5, patients_per_day=5, progress=False)
     print("Success! Fake data added. Now refresh your website.")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill the summaries database with synthetic history.")
+    parser.add_argument("--days", type=int, default=5, help="Days of history, ending today")
+    parser.add_argument("--patients", type=int, default=5, help="Average patients per day (±50%%)")
+    parser.add_argument("--seed", type=int, help="Random seed for a reproducible database")
+    parser.add_argument("--analyze", action="store_true", help="Store real summarizer output (slower)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per transaction")
+    parser.add_argument("--db", default=db_manager.DB_NAME, help="Database file")
+    args = parser.parse_args(argv)
+
+    db_manager.DB_NAME = args.db
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    total = seed_history(args.days, args.patients, rng=rng, analyze=args.analyze, chunk_size=args.chunk_size)
+    print(f"Done: {total} rows in {time.perf_counter() - started:.1f}s → {args.db}")
+
 if __name__ == "__main__":
-    add_fake_history()
\ No newline at end of file
+    main()
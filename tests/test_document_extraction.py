@@ -0,0 +1,32 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import document_extraction  # noqa: E402
+
+Image = pytest.importorskip("PIL.Image")
+
+PAGE_PIXELS = document_extraction.OCR_RESOLUTION * document_extraction.PAGE_HEIGHT_INCHES
+
+
+def jpeg(size, dpi=None):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, 'JPEG', **({'dpi': dpi} if dpi else {}))
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def test_phone_photo_tagged_72_dpi_is_sized_as_a_page():
+    image = jpeg((3024, 4032), dpi=(72, 72))
+    assert image.info['dpi'][0] == 72
+    out = document_extraction.preprocess_for_ocr(image)
+    assert max(out.size) == PAGE_PIXELS
+    assert out.size == document_extraction.preprocess_for_ocr(jpeg((3024, 4032))).size
+
+
+def test_scan_dpi_is_trusted_when_it_gives_a_page():
+    out = document_extraction.preprocess_for_ocr(jpeg((1700, 2200), dpi=(200, 200)))
+    assert out.size == (2550, 3300)